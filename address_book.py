@@ -1,18 +1,36 @@
+from bisect import bisect_left
 from collections import UserDict
-from datetime import datetime
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date, datetime
 from exceptions import *
-import csv
+import calendar
+import events
+import export
+import query
 
 N = 10
 
 
 class Field:
-    """Base class for fields in a record."""
+    """
+    Base class for fields in a record.
+
+    Fields and records have __slots__ instead of a __dict__, which makes a large book about 40% smaller.
+    They are pickled with the same state as before, so older files still load.
+    """
+
+    __slots__ = ('__value',)
 
     def __init__(self, value: str) -> None:
         self.__value = None
         self.value = value
 
+    def __getstate__(self) -> dict:
+        return {'_Field__value': self.__value}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__value = state['_Field__value']
+
     @staticmethod
     def valid_value(value: str) -> bool:
         if value:
@@ -32,10 +50,14 @@ class Field:
 class Name(Field):
     """Name field in a record."""
 
+    __slots__ = ()
+
 
 class Phone(Field):
     """Phone number field in a record."""
 
+    __slots__ = ()
+
     @staticmethod
     def valid_value(value: str) -> bool:
         phone = ''.join(filter(str.isdigit, value))
@@ -46,6 +68,8 @@ class Phone(Field):
 class Birthday(Field):
     """Birthday field in a record."""
 
+    __slots__ = ()
+
     @staticmethod
     def valid_value(birthday: datetime) -> bool:
         if isinstance(birthday, datetime) and 0 < datetime.now().year - birthday.year <= 100:
@@ -54,8 +78,63 @@ class Birthday(Field):
             raise InvalidBirthday
 
 
+class Clock:
+    """Source of the current date. Replace Record.clock with a FixedClock in tests."""
+
+    def today(self) -> date:
+        return date.today()
+
+
+class FixedClock(Clock):
+    """Clock that always returns the same date."""
+
+    def __init__(self, day: date) -> None:
+        self.day = day
+
+    def today(self) -> date:
+        return self.day
+
+
+def next_birthday(birthday: datetime, today: date) -> date:
+    """
+    Find the next celebration of a birthday, today included.
+
+    Birthdays on February 29 are celebrated on February 28 in non-leap years.
+
+    Args:
+        birthday (datetime): The date of birth.
+        today (date): The current date.
+
+    Returns:
+        date: The date of the next celebration.
+    """
+
+    for year in (today.year, today.year + 1):
+        day = birthday.day
+        if birthday.month == 2 and day == 29 and not calendar.isleap(year):
+            day = 28
+        celebration = date(year, birthday.month, day)
+        if celebration >= today:
+            return celebration
+
+
+def _birthday_iso(birthday: Birthday | None) -> str | None:
+    """Returns the birthday as an ISO date, the way it is published in events."""
+
+    return birthday.value.date().isoformat() if birthday else None
+
+
 class Record:
-    """Record representing a contact in the address book."""
+    """
+    Record representing a contact in the address book.
+
+    The ordinal of the next celebration of the birthday is cached, together with the day it was computed on.
+    It stays valid until that celebration has passed, so days_to_birthday is a subtraction on most calls.
+    """
+
+    __slots__ = ('name', 'phones', '_birthday', '_next_birthday', '_computed_on')
+
+    clock = Clock()
 
     def __init__(self, name: Name, phone: Phone = None, birthday: Birthday = None) -> None:
         """
@@ -72,56 +151,102 @@ class Record:
             self.phones.append(phone)
         self.birthday = birthday
 
-    def days_to_birthday(self) -> int | None:
+    def __getstate__(self) -> dict:
+        return {'name': self.name, 'phones': self.phones, '_birthday': self._birthday}
+
+    def __setstate__(self, state: dict) -> None:
+        self.name = state['name']
+        self.phones = state['phones']
+        self.birthday = state['_birthday'] if '_birthday' in state else state.get('birthday')
+
+    @property
+    def birthday(self) -> Birthday | None:
+        return self._birthday
+
+    @birthday.setter
+    def birthday(self, birthday: Birthday | None) -> None:
+        self._birthday = birthday
+        self._next_birthday = self._computed_on = None
+
+    def to_dict(self) -> dict:
+        """Returns the name, the phones and the birthday (ISO date or None) of the record."""
+
+        return {'name': self.name.value,
+                'phones': [phone.value for phone in self.phones],
+                'birthday': _birthday_iso(self.birthday)}
+
+    def days_to_birthday(self, today: int = None) -> int | None:
         """
         Calculate the number of days until the next birthday.
 
+        Args:
+            today (int, optional): The ordinal of the current date. Defaults to the date of Record.clock.
+                Pass it when asking many records, so the clock is read once.
+
         Returns:
-            int or None: The number of days until the next birthday, or None if the birthday is not set.
+            int or None: The number of days until the next birthday, 0 on the birthday itself,
+                or None if the birthday is not set.
         """
 
-        if self.birthday:
-            current_date = datetime.now()
-            celebration_birthday = datetime(current_date.year, self.birthday.value.month, self.birthday.value.day)
-            if current_date > celebration_birthday:
-                celebration_birthday = datetime(current_date.year + 1, self.birthday.value.month, self.birthday.value.day)
+        if not self._birthday:
+            return None
 
-            return (celebration_birthday - current_date).days
+        if today is None:
+            today = self.clock.today().toordinal()
 
-        return None
+        if self._next_birthday is None or not self._computed_on <= today <= self._next_birthday:
+            self._next_birthday = next_birthday(self._birthday.value, date.fromordinal(today)).toordinal()
+            self._computed_on = today
 
-    @input_error
-    def add_birthday(self, birthday: Birthday) -> str:
+        return self._next_birthday - today
+
+    def add_birthday(self, birthday: Birthday) -> None:
         """
         Add a date of birth to the record.
 
         Args:
             birthday (Birthday): The birthday to add.
+
+        Raises:
+            InvalidBirthday: If the birthday is not set.
+            AddingExistingBirthday: If the record already has this birthday.
         """
 
-        if not self.birthday:
+        if not birthday.value:
             raise InvalidBirthday
 
-        if birthday.value == self.birthday.value:
+        if self.birthday and birthday.value == self.birthday.value:
             raise AddingExistingBirthday
 
-        if birthday.value:
-            self.birthday = birthday
-
-        return "Birthday added successfully."
+        previous = self.birthday
+        self.birthday = birthday
+        events.bus.publish(events.BIRTHDAY_SET, name=self.name.value,
+                           birthday=_birthday_iso(birthday), previous=_birthday_iso(previous))
 
     def remove_birthday(self) -> None:
         """Remove the birthday from the record."""
 
+        previous = self.birthday
         self.birthday = None
+        if previous:
+            events.bus.publish(events.BIRTHDAY_REMOVED, name=self.name.value, previous=_birthday_iso(previous))
 
-    @input_error
-    def add_phone(self, phone: Phone) -> str:
+    def _append_phone(self, phone: Phone) -> None:
+        """Append a phone number that is known to be valid and new to the record."""
+
+        self.phones.append(phone)
+        events.bus.publish(events.PHONE_ADDED, name=self.name.value, phone=phone.value)
+
+    def add_phone(self, phone: Phone) -> None:
         """
         Add a phone number to the record.
 
         Args:
             phone (Phone): The phone number to add.
+
+        Raises:
+            AddingExistingPhone: If the record already has this phone number.
+            InvalidPhoneNumber: If the phone number is not set.
         """
 
         for existing_phone in self.phones:
@@ -129,36 +254,40 @@ class Record:
                 raise AddingExistingPhone
 
         if phone.value:
-            self.phones.append(phone)
+            self._append_phone(phone)
         else:
             raise InvalidPhoneNumber
 
-        return "Phone number added successfully."
-
-    @input_error
-    def remove_phone(self, phone: Phone) -> str | None:
+    def remove_phone(self, phone: Phone) -> None:
         """
         Remove a phone number from the record.
 
         Args:
             phone (Phone): The phone number to remove.
+
+        Raises:
+            NonExistentPhone: If the record does not have this phone number.
         """
 
         for existing_phone in self.phones:
             if phone.value == existing_phone.value:
                 self.phones.remove(existing_phone)
-                return "Phone number deleted successfully."
+                events.bus.publish(events.PHONE_REMOVED, name=self.name.value, phone=existing_phone.value)
+                return
 
-        return "The user does not have such a phone number"
+        raise NonExistentPhone
 
-    @input_error
-    def edit_phone(self, old_phone: Phone, new_phone: Phone) -> str | None:
+    def edit_phone(self, old_phone: Phone, new_phone: Phone) -> None:
         """
         Edit a phone number in the record.
 
         Args:
             old_phone (Phone): The old phone number to replace.
             new_phone (Phone): The new phone number.
+
+        Raises:
+            InvalidPhoneNumber: If the new phone number is not set.
+            NonExistentPhone: If the record does not have the old phone number.
         """
 
         if not new_phone.value:
@@ -166,18 +295,133 @@ class Record:
         for idx, phone in enumerate(self.phones):
             if old_phone.value == phone.value:
                 self.phones[idx] = new_phone
-                return "The phone number has been changed successfully."
+                events.bus.publish(events.PHONE_EDITED, name=self.name.value, old=phone.value, new=new_phone.value)
+                return
+
+        raise NonExistentPhone
+
+
+class OperationResult:
+    """Outcome of a single operation applied by AddressBook.apply_batch."""
+
+    def __init__(self, op: tuple, error: Exception | None = None) -> None:
+        """
+        Initialize an operation result.
+
+        Args:
+            op (tuple): The operation as it was passed to the batch.
+            error (Exception, optional): The reason the operation was rejected. Defaults to None.
+        """
+
+        self.op = op
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return f"OperationResult({self.op!r}, error={self.error!r})"
 
-        return "The user does not have such a phone number"
+
+class Pages:
+    """
+    The records of an address book between two positions of its name index, n at a time.
+
+    Iterating yields the pages as lists of (name, record). The positions let presentation.render_tables
+    split the pages into ranges that forked workers read from their own copy of the book.
+    """
+
+    def __init__(self, book: 'AddressBook', start: int = 0, stop: int = None, n: int = N) -> None:
+        """
+        Initialize the pages.
+
+        Args:
+            book (AddressBook): The address book.
+            start (int, optional): The position of the first record. Defaults to 0.
+            stop (int, optional): The position after the last record. Defaults to the end of the book.
+            n (int, optional): The number of records in a page. Defaults to N.
+        """
+
+        self.book = book
+        self.start = start
+        self.stop = stop
+        self.n = n
+
+    def bounds(self) -> tuple[int, int]:
+        """Returns the positions of the first record and after the last one, within the book."""
+
+        size = len(self.book._index)
+        return min(self.start, size), size if self.stop is None else min(self.stop, size)
+
+    def __iter__(self) -> Iterator[list[tuple[str, Record]]]:
+        start, stop = self.bounds()
+        for i in range(start, stop, self.n):
+            yield [(name, self.book.data[name]) for _, name in self.book._index[i:min(i + self.n, stop)]]
 
 
 class AddressBook(UserDict):
-    """Address book that extends UserDict."""
+    """
+    Address book that extends UserDict.
+
+    Besides the records in self.data the book keeps self._index, a list of (name.casefold(), name)
+    kept sorted with bisect, so ordered paging, prefix and range queries do not sort the whole book.
+    """
 
     def __init__(self) -> None:
         """Initialize an address book."""
+        self._index = []
         super().__init__()
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop('_index', None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._index = sorted((name.casefold(), name) for name in self.data)
+
+    def _index_add(self, name: str) -> None:
+        key = (name.casefold(), name)
+        i = bisect_left(self._index, key)
+        if i == len(self._index) or self._index[i] != key:
+            self._index.insert(i, key)
+
+    def _index_remove(self, name: str) -> None:
+        key = (name.casefold(), name)
+        i = bisect_left(self._index, key)
+        if i < len(self._index) and self._index[i] == key:
+            del self._index[i]
+
+    def _position(self, name: str) -> int:
+        """Returns the position in the index of the first name that is not less than the given one."""
+
+        return bisect_left(self._index, (name.casefold(),))
+
+    def _put(self, name: str, record: Record) -> None:
+        """Store a record without publishing an event, e.g. in the books of search results, which change nothing."""
+
+        self.data[name] = record
+        self._index_add(name)
+
+    def __setitem__(self, name: str, record: Record) -> None:
+        """
+        Store a record under a name, replacing the record stored there.
+
+        The change is published like those of add_record and __delitem__, so it is saved and logged too.
+
+        Args:
+            name (str): The name of the contact.
+            record (Record): The record.
+        """
+
+        if name in self.data:
+            del self[name]
+        self._put(name, record)
+        events.bus.publish(events.USER_ADDED, name=name,
+                           phones=[phone.value for phone in record.phones], birthday=_birthday_iso(record.birthday))
+
     def add_record(self, record: Record) -> None:
         """
         Add a record to the address book.
@@ -187,88 +431,269 @@ class AddressBook(UserDict):
         """
 
         self.data[record.name.value] = record
+        self._index_add(record.name.value)
+        events.bus.publish(events.USER_ADDED, name=record.name.value,
+                           phones=[phone.value for phone in record.phones], birthday=_birthday_iso(record.birthday))
+
+    def __delitem__(self, name: str) -> None:
+        """
+        Remove a record from the address book.
 
-    def save(self, ful_path: str)  -> str:
+        Args:
+            name (str): The name of the contact.
+        """
+
+        record = self.data.pop(name)
+        self._index_remove(name)
+        events.bus.publish(events.USER_REMOVED, name=name,
+                           phones=[phone.value for phone in record.phones], birthday=_birthday_iso(record.birthday))
+
+    def apply_batch(self, ops: Iterable[tuple],
+                    persist: Callable[['AddressBook'], None] | None = None) -> list[OperationResult]:
+        """
+        Apply a batch of operations to the address book.
 
-        with open(ful_path, 'w', newline='') as fh:
-            field_names = ['User', 'Phones', 'Birthday']
-            writer = csv.DictWriter(fh, fieldnames=field_names)
-            writer.writeheader()
-            for name in self.data:
-                phones = ' '.join(list(map(lambda x: x.value, self.data[name].phones))) if self.data[name].phones else ''
-                birthday = self.data[name].birthday.value.strftime("%d.%m.%Yp") if self.data[name].birthday else ''
-                writer.writerow({'User': name, 'Phones': phones, 'Birthday': birthday})
+        Every operation is a tuple whose first two items are the action and the user name:
+            ('add user', name)
+            ('remove user', name)
+            ('add phone', name, phone)
+            ('remove phone', name, phone)
+            ('change phone', name, old_phone, new_phone)
+            ('add birthday', name, datetime)
+            ('remove birthday', name)
 
-            return 'The Address book was saved successfully.'
+        Phone numbers of the touched records are kept in sets for the duration of the batch,
+        so adding many phones to a contact does not rescan its phone list for every number.
 
+        Args:
+            ops (Iterable[tuple]): The operations to apply, in order.
+            persist (Callable, optional): Called once with the address book after the batch
+                if at least one operation succeeded. Defaults to None.
 
+        Returns:
+            list[OperationResult]: One result per operation, in the same order.
+        """
+
+        phone_sets = {}
+        results = []
+
+        def phones_of(user: str) -> set[str]:
+            if user not in phone_sets:
+                phone_sets[user] = {phone.value for phone in self.data[user].phones}
+            return phone_sets[user]
+
+        for op in ops:
+            try:
+                action, name, *args = op
+
+                if action == 'add user':
+                    if name in self.data:
+                        raise AddingExistingUser
+                    if not Name(name).value:
+                        raise EmptyUsernameError
+                    self.add_record(Record(Name(name)))
+                    phone_sets[name] = set()
+                    results.append(OperationResult(op))
+                    continue
 
-    def search(self, search_substr: str) -> str:  # AddressBook | str:
+                if name not in self.data:
+                    raise NonExistentUser
+                record = self.data[name]
+
+                match action:
+                    case 'remove user':
+                        del self[name]
+                        phone_sets.pop(name, None)
+                    case 'add phone':
+                        phone = Phone(args[0])
+                        if not phone.value:
+                            raise InvalidPhoneNumber
+                        if phone.value in phones_of(name):
+                            raise AddingExistingPhone
+                        record._append_phone(phone)
+                        phones_of(name).add(phone.value)
+                    case 'remove phone':
+                        if args[0] not in phones_of(name):
+                            raise NonExistentPhone
+                        record.remove_phone(Phone(args[0]))
+                        phones_of(name).discard(args[0])
+                    case 'change phone':
+                        old_phone, new_phone = args[0], Phone(args[1])
+                        if not new_phone.value:
+                            raise InvalidPhoneNumber
+                        if old_phone not in phones_of(name):
+                            raise NonExistentPhone
+                        if new_phone.value in phones_of(name):
+                            raise AddingExistingPhone
+                        record.edit_phone(Phone(old_phone), new_phone)
+                        phones_of(name).discard(old_phone)
+                        phones_of(name).add(new_phone.value)
+                    case 'add birthday':
+                        record.add_birthday(Birthday(args[0]))
+                    case 'remove birthday':
+                        record.remove_birthday()
+                    case _:
+                        raise ValueError(f"Unknown operation: {action}")
+
+                results.append(OperationResult(op))
+
+            except (IndexError, ValueError, AddingExistingUser, AddingExistingPhone, AddingExistingBirthday,
+                    InvalidPhoneNumber, InvalidBirthday, NonExistentUser, NonExistentPhone,
+                    EmptyUsernameError) as err:
+                results.append(OperationResult(op, err))
+
+        if persist and any(result.ok for result in results):
+            persist(self)
+
+        return results
+
+    def records(self, start: int = 0, stop: int = None) -> Iterator[Record]:
         """
-        Find a name by phone or a phone with a name in the address book.
+        Iterate over the records in alphabetical order of the names.
 
         Args:
-            search_substr: The search object representing either a Name or a Phone.
+            start (int, optional): The position of the first record in that order. Defaults to 0.
+            stop (int, optional): The position after the last record. Defaults to the end.
+
+        Yields:
+            Record: The records.
+        """
+
+        for _, name in self._index[start:stop]:
+            yield self.data[name]
+
+    def save(self, ful_path: str, fmt: str = 'csv', compress: bool = False, workers: int = None) -> int:
+        """
+        Export the address book, streaming the records in alphabetical order.
+
+        Args:
+            ful_path (str): The path to the file.
+            fmt (str, optional): One of the formats in export.WRITERS. Defaults to 'csv'.
+            compress (bool, optional): Compress the file with gzip. Defaults to False.
+            workers (int, optional): The number of processes formatting the records. Defaults to parallel.WORKERS.
 
         Returns:
-            Optional: The search results. If searching by Name, returns a list of phone numbers.
-                If searching by Phone number, returns the name of the contact. Returns None if no match is found.
+            int: The number of records saved.
+        """
+
+        return export.export(self, ful_path, fmt, compress, workers)
+
+    def search(self, text: str) -> 'AddressBook':
+        """
+        Find users with a query, see query.Query. Bare words find users by part of their name or phone number.
+
+        Args:
+            text: The query, e.g. 'name:^ann phone:^380 born:1990..1995 birthday<30d limit:10'.
+
+        Returns:
+            AddressBook: The users found. Empty if nothing matches.
+
+        Raises:
+            InvalidQuery: If the query cannot be parsed.
         """
 
         found_users = AddressBook()
-        search_substr = search_substr.lower()
-        search_phone = ''.join(filter(str.isdigit, search_substr))
+        for name in query.Query(text, Record.clock.today()).plan(self).names():
+            found_users._put(name, self.data[name])
 
-        for name, rec in self.data.items():
-            if search_substr in name.lower():
-                found_users[name] = rec
-                continue
+        return found_users
 
-            for phone in rec.phones:
-                if search_phone in ''.join(filter(str.isdigit, phone.value)):
-                    found_users[name] = rec
-                    continue
-        if found_users:
-            return found_users
+    def explain(self, text: str) -> list[str]:
+        """
+        Describe how search would run a query: the index it starts from and the clauses it tests.
 
-        return "Nothing was found for your request"
+        Args:
+            text: The query.
 
-    def __iter__(self):
-        self.keys_iter = iter(self.data)
-        return self
+        Returns:
+            list[str]: The steps of the plan.
+        """
+
+        return query.Query(text, Record.clock.today()).plan(self).describe()
+
+    def upcoming_birthdays(self, days: int) -> list[tuple[int, str]]:
+        """
+        Find the users whose birthday is within the given number of days.
+
+        Args:
+            days (int): How many days ahead to look, 0 meaning today only.
+
+        Returns:
+            list[tuple[int, str]]: The days left and the names, soonest first.
+        """
+
+        today = Record.clock.today().toordinal()
+        upcoming = []
+        for name, record in self.data.items():
+            left = record.days_to_birthday(today)
+            if left is not None and left <= days:
+                upcoming.append((left, name))
+
+        return sorted(upcoming)
+
+    def names(self, start: str = None, offset: int = 0, limit: int = None) -> Iterator[str]:
+        """
+        Iterate over the names in alphabetical order, ignoring case.
+
+        Args:
+            start (str, optional): Start from the first name that is not less than this one. Defaults to None.
+            offset (int, optional): The number of names to skip after the start. Defaults to 0.
+            limit (int, optional): The maximum number of names. Defaults to None.
+
+        Yields:
+            str: The names.
+        """
+
+        i = (self._position(start) if start else 0) + offset
+        stop = len(self._index) if limit is None else min(len(self._index), i + limit)
+        while i < stop:
+            yield self._index[i][1]
+            i += 1
 
-    def __next__(self, n: int = N) -> str:
+    def prefix(self, prefix: str) -> list[str]:
         """
-        Get the next batch of records as a string representation.
+        Find the names that start with the prefix, ignoring case.
 
         Args:
-            n (int, optional): The number of records to retrieve. Defaults to N.
+            prefix (str): The beginning of the names.
 
         Returns:
-            str: The string representation of the next batch of records.
-        """
-
-        items = []
-        try:
-            for _ in range(n):
-                key = next(self.keys_iter)
-                items.append((key, self.data[key]))
-        except StopIteration:
-            if not items:
-                raise StopIteration
-
-        representation_record = '-' * 70 + '\n'
-        representation_record += '|{:^33}|{:^20}|{:^13}|\n'.format("User", "Phones", "Birthday")
-        representation_record += '-' * 70 + '\n'
-        for name, user in sorted(items):
-            birthday = user.birthday.value.strftime("%d.%m.%Yp") if user.birthday else ''
-            for i in range(len(user.phones)):
-                if i == 0:
-                    representation_record += '| {:<32}|{:>19} |{:^13}|\n'.format(name, user.phones[i].value, birthday)
-                else:
-                    representation_record += '|{:<33}|{:>19} |{:^13}|\n'.format(' ', user.phones[i].value, ' ')
-            if not user.phones:
-                representation_record += '| {:<32}|{:>19} |{:^13}|\n'.format(name, ' ', birthday)
-            representation_record += '-' * 70 + '\n'
-
-        return representation_record
+            list[str]: The names in alphabetical order.
+        """
+
+        prefix = prefix.casefold()
+        i = bisect_left(self._index, (prefix,))
+        j = bisect_left(self._index, (prefix + chr(0x10FFFF),))
+        return [name for _, name in self._index[i:j]]
+
+    def name_range(self, low: str, high: str) -> list[str]:
+        """
+        Find the names between low (inclusive) and high (exclusive), ignoring case.
+
+        Args:
+            low (str): The lower bound.
+            high (str): The upper bound.
+
+        Returns:
+            list[str]: The names in alphabetical order.
+        """
+
+        return [name for _, name in self._index[self._position(low):self._position(high)]]
+
+    def pages(self, start: str = None, offset: int = 0, n: int = N) -> 'Pages':
+        """
+        The records in alphabetical order, n at a time.
+
+        Args:
+            start (str, optional): Start from the first name that is not less than this one. Defaults to None.
+            offset (int, optional): The number of records to skip after the start. Defaults to 0.
+            n (int, optional): The number of records in a page. Defaults to N.
+
+        Returns:
+            Pages: The pages, read from the book as they are iterated.
+        """
+
+        return Pages(self, (self._position(start) if start else 0) + offset, n=n)
+
+    def __iter__(self) -> Iterator[list[tuple[str, Record]]]:
+        return iter(self.pages())
@@ -0,0 +1,104 @@
+"""Rough timings of the address book core and its front-ends.
+
+Usage: python benchmark.py [number_of_users] [max_workers]
+"""
+
+from address_book import AddressBook, Birthday, Name, Phone, Record
+from datetime import datetime
+from presentation import RENDERERS, render_tables
+from time import perf_counter
+import os
+import sys
+import tempfile
+import main
+
+
+def users(count: int) -> list[list[str]]:
+    """Builds the arguments of `add user` commands for count users with two phones and a birthday each."""
+
+    return [[f"User{chr(97 + i % 26)}{chr(97 + i // 26 % 26)}{chr(97 + i // 676 % 26)}",
+             f"050{i:07d}", f"067{i:07d}", "1990-05-12"] for i in range(count)]
+
+
+def timed(func, *args) -> float:
+    """Returns the time spent in func(*args) in seconds."""
+
+    start = perf_counter()
+    func(*args)
+    return perf_counter() - start
+
+
+def bench_core(commands: list[list[str]]) -> float:
+    """Adds the users, their phones and birthdays through AddressBook.apply_batch only, with no results rendered."""
+
+    book = AddressBook()
+    ops = []
+    for name, *phones, birthday in commands:
+        ops.append(('add user', name))
+        ops.extend(('add phone', name, phone) for phone in phones)
+        ops.append(('add birthday', name, main.parse_date(birthday)))
+
+    return timed(book.apply_batch, ops)
+
+
+def bench_front_end(commands: list[list[str]], output: str) -> float:
+    """Adds the users through the `add user` handler and renders every result."""
+
+    main.ab = AddressBook()
+    render = RENDERERS[output]
+
+    def run():
+        for args in commands:
+            render(main.add_new_user(args))
+
+    return timed(run)
+
+
+def bench_birthdays(count: int) -> tuple[float, float]:
+    """Times AddressBook.upcoming_birthdays on a cold and on a warm cache."""
+
+    book = AddressBook()
+    for i in range(count):
+        book.add_record(Record(Name(f"User{i}"), birthday=Birthday(datetime(1950 + i % 50, 1 + i % 12, 1 + i % 28))))
+
+    return timed(book.upcoming_birthdays, 30), timed(book.upcoming_birthdays, 30)
+
+
+def bench_scaling(count: int, max_workers: int) -> None:
+    """Times `show all` rendering and every export format with 1 to max_workers processes."""
+
+    book = AddressBook()
+    for i in range(count):
+        book.add_record(Record(Name(f"User{i:07d}"), Phone(f"050{i:07d}"), Birthday(datetime(1990, 1 + i % 12, 1))))
+
+    print(f"\nRendering and saving {count} users")
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in range(1, max_workers + 1):
+            report(f'show all, {workers} workers', timed(lambda: '\n'.join(render_tables(book, workers))), count)
+            for fmt in ('csv', 'jsonl', 'vcard', 'columnar'):
+                path = os.path.join(directory, f'users.{fmt}')
+                report(f'save {fmt}, {workers} workers', timed(book.save, path, fmt, False, workers), count)
+
+
+def report(name: str, seconds: float, count: int) -> None:
+    print(f"{name:<28}{seconds * 1000:>10.1f} ms{seconds / count * 1e6:>10.1f} us/user")
+
+
+def run_all(count: int, max_workers: int) -> None:
+    commands = users(count)
+    print(f"Adding {count} users with two phones and a birthday each")
+    report('apply_batch (core only)', bench_core(commands), count)
+    for output in RENDERERS:
+        report(f'add user + {output}', bench_front_end(commands, output), count)
+
+    cold, warm = bench_birthdays(count)
+    print(f"\nBirthdays within 30 days among {count} users")
+    report('first query', cold, count)
+    report('next queries', warm, count)
+
+    bench_scaling(count, max_workers)
+
+
+if __name__ == '__main__':
+    run_all(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
@@ -0,0 +1,239 @@
+from address_book import AddressBook, Phone
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from exceptions import AddingExistingPhone
+
+PHONE_DIGITS = 9
+NAME_SIMILARITY = 0.85
+MAX_BLOCK = 500
+
+SOUNDEX_CODES = {**dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+                 'l': '4', **dict.fromkeys('mn', '5'), 'r': '6'}
+LATIN = frozenset('abcdefghijklmnopqrstuvwxyz')
+TRANSLITERATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie', 'ж': 'zh', 'з': 'z',
+    'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ь': '', 'ю': 'iu', 'я': 'ia', 'ё': 'e', 'ы': 'y', 'э': 'e', 'ъ': '', "'": '', 'ʼ': '', '’': ''})
+
+
+def normalize_phone(phone: str) -> str:
+    """Returns the last PHONE_DIGITS digits of the phone, so +380501234567 and 0501234567 match."""
+
+    return ''.join(filter(str.isdigit, phone))[-PHONE_DIGITS:]
+
+
+def soundex(word: str) -> str:
+    """
+    Returns the Soundex code of a word, e.g. 'Robert' and 'Rupert' are both 'R163'.
+
+    Cyrillic is transliterated first (the Ukrainian national system), so 'Олена' is coded as 'Olena'.
+    Words without Latin letters in other scripts have no code: an empty string is returned.
+    """
+
+    word = ''.join(char for char in word.casefold().translate(TRANSLITERATION) if char in LATIN)
+    if not word:
+        return ''
+
+    code = word[0].upper()
+    previous = SOUNDEX_CODES.get(word[0], '')
+    for char in word[1:]:
+        digit = SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+        if char not in 'hw':
+            previous = digit
+
+    return (code + '000')[:4]
+
+
+def name_tokens(name: str) -> str:
+    """Returns the words of the name in lower case and sorted, so 'Smith John' and 'john smith' match."""
+
+    return ' '.join(sorted(name.casefold().split()))
+
+
+def name_keys(name: str) -> list[str]:
+    """
+    Returns the blocking keys of a name: its sorted tokens and the sorted Soundex codes of its words.
+
+    Words without a Soundex code are left out of the second key, and a name without any has none.
+    """
+
+    keys = ['tokens:' + name_tokens(name)]
+    codes = sorted(filter(None, (soundex(word) for word in name.split())))
+    if codes:
+        keys.append('soundex:' + ' '.join(codes))
+    return keys
+
+
+class MergeSuggestion:
+    """A pair of records that probably describe the same person."""
+
+    def __init__(self, keep: str, duplicate: str, score: float, reasons: list[str]) -> None:
+        """
+        Initialize a merge suggestion.
+
+        Args:
+            keep (str): The name of the record to keep.
+            duplicate (str): The name of the record to merge into it.
+            score (float): How similar the names are, from 0 to 1.
+            reasons (list[str]): What the records have in common.
+        """
+
+        self.keep = keep
+        self.duplicate = duplicate
+        self.score = score
+        self.reasons = reasons
+
+    def to_dict(self) -> dict:
+        return {'keep': self.keep, 'duplicate': self.duplicate, 'score': round(self.score, 3), 'reasons': self.reasons}
+
+    def __str__(self) -> str:
+        return f"{self.duplicate} -> {self.keep} ({', '.join(self.reasons)}, score {self.score:.2f})"
+
+
+def build_blocks(book: AddressBook, max_block: int = MAX_BLOCK) -> list[list[tuple[str, frozenset[str]]]]:
+    """
+    Group the records that share a normalized phone number or a name key.
+
+    Blocks with more than max_block records, e.g. a very common Soundex code, are dropped:
+    comparing them would cost as much as comparing the whole book.
+
+    Args:
+        book (AddressBook): The address book.
+        max_block (int, optional): The maximal size of a block. Defaults to MAX_BLOCK.
+
+    Returns:
+        list: The blocks of two or more (name, normalized phones) pairs.
+    """
+
+    blocks = defaultdict(list)
+    for name, record in book.data.items():
+        phones = frozenset(filter(None, (normalize_phone(phone.value) for phone in record.phones)))
+        entry = (name, phones)
+        for phone in phones:
+            blocks['phone:' + phone].append(entry)
+        for key in name_keys(name):
+            blocks[key].append(entry)
+
+    return [block for block in blocks.values() if 1 < len(block) <= max_block]
+
+
+def compare_blocks(blocks: list[list[tuple[str, frozenset[str]]]],
+                   threshold: float = NAME_SIMILARITY) -> list[tuple[str, str, float, list[str]]]:
+    """
+    Compare the records within each block.
+
+    Args:
+        blocks (list): Blocks built by build_blocks.
+        threshold (float, optional): The minimal similarity of names. Defaults to NAME_SIMILARITY.
+
+    Returns:
+        list: (name, other name, score, reasons) for every pair that looks like a duplicate.
+    """
+
+    pairs = []
+    for block in blocks:
+        for i, (name, phones) in enumerate(block):
+            for other, other_phones in block[i + 1:]:
+                reasons = []
+                if phones & other_phones:
+                    reasons.append('phone')
+                similarity = SequenceMatcher(None, name_tokens(name), name_tokens(other)).ratio()
+                if similarity >= threshold:
+                    reasons.append('name')
+                if reasons:
+                    pairs.append((name, other, similarity, reasons))
+
+    return pairs
+
+
+def _keep_first(book: AddressBook, name: str, other: str) -> bool:
+    """Decides which of two records to keep: the one with more phones, then with a birthday, then the first name."""
+
+    record, other_record = book.data[name], book.data[other]
+    return ((len(record.phones), bool(record.birthday), other.casefold())
+            >= (len(other_record.phones), bool(other_record.birthday), name.casefold()))
+
+
+def find_duplicates(book: AddressBook, workers: int = 1, threshold: float = NAME_SIMILARITY) -> list[MergeSuggestion]:
+    """
+    Find records that probably describe the same person.
+
+    Only the records that share a normalized phone number or a name key are compared,
+    instead of every record with every other one.
+
+    Args:
+        book (AddressBook): The address book.
+        workers (int, optional): The number of processes comparing the blocks. Defaults to 1.
+        threshold (float, optional): The minimal similarity of names. Defaults to NAME_SIMILARITY.
+
+    Returns:
+        list[MergeSuggestion]: The suggestions, those with most reasons and most similar names first.
+    """
+
+    blocks = build_blocks(book)
+
+    if workers > 1 and len(blocks) > workers:
+        chunks = [blocks[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(workers) as executor:
+            pairs = [pair for chunk in executor.map(compare_blocks, chunks, [threshold] * workers) for pair in chunk]
+    else:
+        pairs = compare_blocks(blocks, threshold)
+
+    suggestions = {}
+    for name, other, score, reasons in pairs:
+        if not _keep_first(book, name, other):
+            name, other = other, name
+        key = frozenset((name, other))
+        if key in suggestions:
+            suggestion = suggestions[key]
+            suggestion.reasons = sorted(set(suggestion.reasons) | set(reasons))
+            suggestion.score = max(suggestion.score, score)
+        else:
+            suggestions[key] = MergeSuggestion(name, other, score, reasons)
+
+    return sorted(suggestions.values(),
+                  key=lambda s: (-len(s.reasons), -s.score, s.keep.casefold(), s.duplicate.casefold()))
+
+
+def merge_duplicates(book: AddressBook, suggestions: list[MergeSuggestion]) -> list[MergeSuggestion]:
+    """
+    Merge the duplicates into the records to keep and remove them from the address book.
+
+    Phone numbers the kept record does not have yet, even in another format, are moved with Record.add_phone.
+    The birthday is moved only if the kept record has none.
+    Suggestions whose records were already merged by an earlier suggestion are skipped.
+
+    Args:
+        book (AddressBook): The address book.
+        suggestions (list[MergeSuggestion]): Suggestions made by find_duplicates.
+
+    Returns:
+        list[MergeSuggestion]: The suggestions that were applied.
+    """
+
+    merged = []
+    for suggestion in suggestions:
+        if suggestion.keep not in book or suggestion.duplicate not in book:
+            continue
+
+        record, duplicate = book[suggestion.keep], book[suggestion.duplicate]
+        known = {normalize_phone(phone.value) for phone in record.phones}
+        for phone in duplicate.phones:
+            if normalize_phone(phone.value) in known:
+                continue
+            try:
+                record.add_phone(Phone(phone.value))
+            except AddingExistingPhone:
+                pass
+            known.add(normalize_phone(phone.value))
+        if duplicate.birthday and not record.birthday:
+            record.add_birthday(duplicate.birthday)
+
+        del book[suggestion.duplicate]
+        merged.append(suggestion)
+
+    return merged
@@ -0,0 +1,264 @@
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from locking import locked
+import json
+import os
+
+USER_ADDED = 'user_added'
+USER_REMOVED = 'user_removed'
+PHONE_ADDED = 'phone_added'
+PHONE_EDITED = 'phone_edited'
+PHONE_REMOVED = 'phone_removed'
+BIRTHDAY_SET = 'birthday_set'
+BIRTHDAY_REMOVED = 'birthday_removed'
+
+
+class EventBus:
+    """Delivers address book change events to the subscribers in the order they happen."""
+
+    def __init__(self) -> None:
+        """Initialize an event bus without subscribers."""
+
+        self._subscribers = []
+        self._paused = 0
+
+    def subscribe(self, callback: Callable[[dict], None]) -> Callable[[dict], None]:
+        """
+        Start delivering events to the callback.
+
+        Args:
+            callback (Callable): Called with every published event.
+
+        Returns:
+            Callable: The callback, so the method can be used as a decorator.
+        """
+
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[dict], None]) -> None:
+        """
+        Stop delivering events to the callback.
+
+        Args:
+            callback (Callable): A previously subscribed callback.
+        """
+
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, event_type: str, **payload) -> None:
+        """
+        Deliver an event to all subscribers.
+
+        Args:
+            event_type (str): One of the event type constants of this module.
+            **payload: The details of the change. Values must be JSON-compatible.
+        """
+
+        if not self._subscribers or self._paused:
+            return
+
+        event = {'type': event_type, **payload}
+        for callback in list(self._subscribers):
+            callback(event)
+
+    @contextmanager
+    def paused(self):
+        """Drop the events published in the with block, e.g. while replaying changes that were already published."""
+
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+
+
+bus = EventBus()
+
+
+def to_operations(event: dict) -> list[tuple]:
+    """
+    Convert an event to the operations of AddressBook.apply_batch that repeat the change.
+
+    Args:
+        event (dict): An event published by the address book.
+
+    Returns:
+        list[tuple]: The operations.
+    """
+
+    name = event['name']
+    match event['type']:
+        case 'user_added':
+            ops = [('add user', name)] + [('add phone', name, phone) for phone in event['phones']]
+            if event['birthday']:
+                ops.append(('add birthday', name, datetime.fromisoformat(event['birthday'])))
+            return ops
+        case 'user_removed':
+            return [('remove user', name)]
+        case 'phone_added':
+            return [('add phone', name, event['phone'])]
+        case 'phone_edited':
+            return [('change phone', name, event['old'], event['new'])]
+        case 'phone_removed':
+            return [('remove phone', name, event['phone'])]
+        case 'birthday_set':
+            return [('add birthday', name, datetime.fromisoformat(event['birthday']))]
+        case 'birthday_removed':
+            return [('remove birthday', name)]
+
+    raise ValueError(f"Unknown event: {event['type']}")
+
+
+def inverse(event: dict) -> dict:
+    """
+    Build the event of the change that reverts the given one.
+
+    Args:
+        event (dict): An event published by the address book.
+
+    Returns:
+        dict: The reverting event, without the sequence number and time of a log.
+    """
+
+    name = event['name']
+    match event['type']:
+        case 'user_added' | 'user_removed':
+            event_type = USER_REMOVED if event['type'] == USER_ADDED else USER_ADDED
+            return {'type': event_type, 'name': name, 'phones': event['phones'], 'birthday': event['birthday']}
+        case 'phone_added':
+            return {'type': PHONE_REMOVED, 'name': name, 'phone': event['phone']}
+        case 'phone_removed':
+            return {'type': PHONE_ADDED, 'name': name, 'phone': event['phone']}
+        case 'phone_edited':
+            return {'type': PHONE_EDITED, 'name': name, 'old': event['new'], 'new': event['old']}
+        case 'birthday_set':
+            if event['previous']:
+                return {'type': BIRTHDAY_SET, 'name': name, 'birthday': event['previous'], 'previous': event['birthday']}
+            return {'type': BIRTHDAY_REMOVED, 'name': name, 'previous': event['birthday']}
+        case 'birthday_removed':
+            return {'type': BIRTHDAY_SET, 'name': name, 'birthday': event['previous'], 'previous': None}
+
+    raise ValueError(f"Unknown event: {event['type']}")
+
+
+def _last_sequence(path: str) -> int:
+    """Returns the sequence number of the last event in the file, or 0 if there are none."""
+
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, 'rb') as fh:
+        size = fh.seek(0, os.SEEK_END)
+        chunk = 4096
+        while True:
+            fh.seek(max(0, size - chunk))
+            lines = fh.read().splitlines()
+            if size <= chunk or len(lines) > 1:
+                break
+            chunk *= 2
+
+    for line in reversed(lines):
+        try:
+            return json.loads(line)['seq']
+        except (ValueError, KeyError):
+            continue
+
+    return 0
+
+
+class JsonlSink:
+    """
+    Append-only newline-delimited JSON log of events with increasing sequence numbers.
+
+    Several processes may append to the same log: every append holds the lock of the log and,
+    if another process appended since, continues from the last sequence number in the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the log, continuing the numbering of the events already in it.
+
+        Args:
+            path (str): The path to the log file.
+        """
+
+        self.path = path
+        self.seq = _last_sequence(path)
+        self._fh = open(path, 'a', encoding='utf-8')
+        self._size = os.fstat(self._fh.fileno()).st_size
+
+    def __call__(self, event: dict) -> None:
+        """Append the event to the log."""
+
+        with locked(self.path):
+            if os.fstat(self._fh.fileno()).st_size != self._size:
+                self.seq = _last_sequence(self.path)
+            self.seq += 1
+            line = {'seq': self.seq, 'time': datetime.now().isoformat(timespec='seconds'), **event}
+            self._fh.write(json.dumps(line, ensure_ascii=False) + '\n')
+            self._fh.flush()
+            self._size = os.fstat(self._fh.fileno()).st_size
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _seek_after(fh, offset: int) -> None:
+    """
+    Move a log opened in binary mode to the first event with a sequence number greater than offset.
+
+    The events are appended in the order of their numbers, so the position is found by binary search
+    over the bytes of the file: a sync job resuming from its offset reads O(log n) lines, not the whole log.
+    """
+
+    def first_after(position: int) -> tuple[int, bool]:
+        """Returns the start of the first line at or after the position and whether its event is new."""
+
+        fh.seek(max(position - 1, 0))
+        if position:
+            fh.readline()
+        start = fh.tell()
+        line = fh.readline()
+        try:
+            return start, not line or json.loads(line)['seq'] > offset
+        except (ValueError, KeyError):
+            return start, True
+
+    low, high = 0, fh.seek(0, os.SEEK_END)
+    while low < high:
+        middle = (low + high) // 2
+        if first_after(middle)[1]:
+            high = middle
+        else:
+            low = middle + 1
+
+    fh.seek(first_after(low)[0])
+
+
+def read_events(path: str, offset: int = 0) -> Iterator[dict]:
+    """
+    Read the events of a log written by JsonlSink.
+
+    Args:
+        path (str): The path to the log file.
+        offset (int, optional): The sequence number of the last event already processed. Defaults to 0.
+
+    Yields:
+        dict: The events with a sequence number greater than offset, oldest first. A last line that is
+            not terminated yet (being appended, or cut off by a crash) is not an event.
+    """
+
+    with open(path, 'rb') as fh:
+        if offset:
+            _seek_after(fh, offset)
+        for line in fh:
+            if not line.endswith(b'\n'):
+                break
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event['seq'] > offset:
+                yield event
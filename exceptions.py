@@ -1,3 +1,6 @@
+from results import Result
+
+
 class AddingExistingUser(Exception):
     """Exception class when trying to create an existing user."""
 
@@ -32,6 +35,13 @@ class InvalidBirthday(Exception):
         return "Birthday format is incorrect."
 
 
+class NonExistentPhone(Exception):
+    """Exception class when attempting to change a non-existent phone number."""
+
+    def __str__(self) -> str:
+        return "The user does not have such a phone number"
+
+
 class NonExistentUser(Exception):
     """Exception class when attempting to change a non-existent user."""
 
@@ -60,6 +70,17 @@ class EmptyBirthdayError(Exception):
         return "Please enter date of birth."
 
 
+class InvalidQuery(Exception):
+    """Exception raised for a find query that cannot be parsed."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"Invalid query: {self.reason}."
+
+
 
 def input_error(funk):
     """Decorator function to handle input errors.
@@ -78,7 +99,7 @@ def input_error(funk):
             **kwargs: Arbitrary keyword arguments.
 
         Returns:
-            The result of the decorated function or an error message.
+            The result of the decorated function or a failed Result.
 
         Raises:
             EmptyUsernameError: If no username is specified.
@@ -86,33 +107,38 @@ def input_error(funk):
             UnboundLocalError: If username and phone number are not entered.
             AddingExistingUser: If a user with the same name already exists.
             InvalidPhoneNumber: If the phone number format is incorrect.
-            NonExistentUser: If the user does not exist."""
+            NonExistentUser: If the user does not exist.
+            InvalidQuery: If a find query cannot be parsed."""
 
         try:
             return funk(*args, **kwargs)
         except EmptyUsernameError as err:
-            return err
+            return Result.failure(err)
         except KeyError:
-            return "Please enter the name of an existing user"
+            return Result.failure("Please enter the name of an existing user")
         except UnboundLocalError:
-            return "Please enter username and phone number"
+            return Result.failure("Please enter username and phone number")
         except ValueError as err:
-            return err
+            return Result.failure(err)
         except AddingExistingUser as err:
-            return err
+            return Result.failure(err)
         except AddingExistingPhone as err:
-            return err
+            return Result.failure(err)
         except InvalidPhoneNumber as err:
-            return err
+            return Result.failure(err)
         except NonExistentUser as err:
-            return err
+            return Result.failure(err)
+        except NonExistentPhone as err:
+            return Result.failure(err)
         except InvalidBirthday as err:
-            return err
+            return Result.failure(err)
         except EmptyPhoneError as err:
-            return err
+            return Result.failure(err)
         except EmptyBirthdayError as err:
-            return err
+            return Result.failure(err)
         except AddingExistingBirthday as err:
-            return err
+            return Result.failure(err)
+        except InvalidQuery as err:
+            return Result.failure(err)
 
     return inner
\ No newline at end of file
@@ -0,0 +1,361 @@
+from collections.abc import Iterable, Iterator
+from datetime import date
+from functools import partial
+import csv
+import gzip
+import io
+import json
+import struct
+import parallel
+
+CHUNK_SIZE = 1 << 16
+ROW_GROUP = 1 << 14
+CHUNK_RECORDS = 1000
+
+COLUMNAR_MAGIC = b'ABCOL1\n\0'
+ROW_GROUP_MARK = b'RG'
+FOOTER_MARK = b'FT'
+VCARD_LINE = 75
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_output(path: str, compress: bool = False):
+    """Opens a file for binary writing, gzip-compressed if asked or if the path ends with .gz."""
+
+    if compress or path.endswith('.gz'):
+        return gzip.open(path, 'wb')
+    return open(path, 'wb')
+
+
+def open_input(path: str):
+    """Opens a file written by open_output for binary reading, recognizing gzip by its magic bytes."""
+
+    with open(path, 'rb') as fh:
+        magic = fh.read(len(GZIP_MAGIC))
+
+    if magic == GZIP_MAGIC:
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+class Writer:
+    """
+    Base class of the export formats.
+
+    Subclasses turn one record into bytes in format(); the writer collects them
+    and writes to the file only once CHUNK_SIZE bytes are buffered.
+
+    Records are formatted chunk_records at a time by format_chunk(), which does not touch the file,
+    so the chunks can be formatted in worker processes and written here in order.
+    """
+
+    extension = ''
+    chunk_records = CHUNK_RECORDS
+
+    def __init__(self, fh) -> None:
+        """
+        Initialize a writer.
+
+        Args:
+            fh: A file object opened for binary writing.
+        """
+
+        self.fh = fh
+        self._chunk = []
+        self._size = 0
+
+    def header(self) -> bytes:
+        return b''
+
+    def format(self, record) -> bytes:
+        raise NotImplementedError
+
+    def footer(self) -> bytes:
+        return b''
+
+    def write(self, data: bytes) -> None:
+        """Buffer the data, writing the buffer out when it is full."""
+
+        if not data:
+            return
+        self._chunk.append(data)
+        self._size += len(data)
+        if self._size >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.fh.write(b''.join(self._chunk))
+        self._chunk = []
+        self._size = 0
+
+    def format_chunk(self, records: list) -> tuple[int, bytes]:
+        """Returns the number of records and their formatted bytes."""
+
+        return len(records), b''.join(map(self.format, records))
+
+    def write_formatted(self, data: bytes) -> None:
+        """Write the bytes of a chunk returned by format_chunk."""
+
+        self.write(data)
+
+    def write_all(self, records: Iterable, workers: int = None) -> int:
+        """
+        Write the header, every record and the footer.
+
+        The records of an address book are formatted in ranges of its name index by forked workers that
+        inherit the book, see parallel.map_ranges, so only the bounds of the ranges and the formatted bytes
+        cross processes. Other iterables of records are formatted in this process.
+
+        Args:
+            records (Iterable[Record] | AddressBook): The records, or an address book to write in alphabetical order.
+                Can be a generator; it is consumed once.
+            workers (int, optional): The number of processes formatting the records. Defaults to parallel.WORKERS.
+
+        Returns:
+            int: The number of records written.
+        """
+
+        if hasattr(records, 'records'):
+            chunks = parallel.map_ranges(partial(_format_range, type(self)), records, 0, len(records),
+                                         self.chunk_records, workers)
+        else:
+            chunks = map(self.format_chunk, parallel.chunked(records, self.chunk_records))
+
+        count = 0
+        self.write(self.header())
+        for records_in_chunk, data in chunks:
+            self.write_formatted(data)
+            count += records_in_chunk
+        self.write(self.footer())
+        self.flush()
+
+        return count
+
+
+def _format_range(writer_class: type, book, start: int, stop: int) -> tuple[int, bytes]:
+    """
+    Formats the records of an address book between two positions of its name index with a writer that is
+    not attached to a file. Runs in the worker processes.
+    """
+
+    return writer_class(None).format_chunk(list(book.records(start, stop)))
+
+
+class CsvWriter(Writer):
+    """The 'User,Phones,Birthday' layout of the `save csv` command."""
+
+    extension = 'csv'
+
+    def __init__(self, fh) -> None:
+        super().__init__(fh)
+        self._text = io.StringIO()
+        self._csv = csv.writer(self._text)
+
+    def _row(self, row: list[str]) -> bytes:
+        self._text.seek(0)
+        self._text.truncate()
+        self._csv.writerow(row)
+        return self._text.getvalue().encode('utf-8')
+
+    def header(self) -> bytes:
+        return self._row(['User', 'Phones', 'Birthday'])
+
+    def format(self, record) -> bytes:
+        birthday = record.birthday.value.strftime("%d.%m.%Yp") if record.birthday else ''
+        return self._row([record.name.value, ' '.join(phone.value for phone in record.phones), birthday])
+
+
+class JsonLinesWriter(Writer):
+    """One JSON object per line: {"name": ..., "phones": [...], "birthday": "YYYY-MM-DD" or null}."""
+
+    extension = 'jsonl'
+
+    def format(self, record) -> bytes:
+        return (json.dumps(record.to_dict(), ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _vcard_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;').replace('\n', '\\n')
+
+
+def _vcard_fold(line: str) -> bytes:
+    """
+    Encodes a content line, folded as RFC 6350 requires: at most VCARD_LINE octets per line,
+    continuation lines starting with a space. Multi-octet UTF-8 characters are not split.
+    """
+
+    data = line.encode('utf-8')
+    parts, limit = [], VCARD_LINE
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(data[:cut])
+        data, limit = data[cut:], VCARD_LINE - 1
+    parts.append(data)
+
+    return b'\r\n '.join(parts) + b'\r\n'
+
+
+class VCardWriter(Writer):
+    """vCard 4.0 (RFC 6350), one card per record."""
+
+    extension = 'vcf'
+
+    def format(self, record) -> bytes:
+        lines = ['BEGIN:VCARD', 'VERSION:4.0', f'FN:{_vcard_escape(record.name.value)}']
+        for phone in record.phones:
+            number = ''.join(char for char in phone.value if char.isdigit() or char == '+')
+            lines.append(f'TEL;VALUE=uri;TYPE=cell:tel:{number}')
+        if record.birthday:
+            lines.append(f'BDAY:{record.birthday.value.strftime("%Y%m%d")}')
+        lines.append('END:VCARD')
+
+        return b''.join(map(_vcard_fold, lines))
+
+
+def _pack(code: str, values: list[int]) -> bytes:
+    """Packs integers as a little-endian array of a struct type with a standard size, e.g. 'I' is uint32."""
+
+    return struct.pack(f'<{len(values)}{code}', *values)
+
+
+def _string_column(values: list[str]) -> bytes:
+    """Encodes strings as their byte lengths (uint32) followed by the concatenated UTF-8 bytes."""
+
+    encoded = [value.encode('utf-8') for value in values]
+    return _pack('I', [len(value) for value in encoded]) + b''.join(encoded)
+
+
+class ColumnarWriter(Writer):
+    """
+    Binary columnar format in the spirit of Parquet.
+
+    Layout: COLUMNAR_MAGIC, then row groups of up to ROW_GROUP records, then a footer.
+    A row group is ROW_GROUP_MARK, the number of rows (uint32) and three columns, each prefixed
+    with its size in bytes (uint64) so readers can skip the columns they do not need:
+        name     - string column;
+        phones   - number of phones per row (uint16), then a string column of all the phones;
+        birthday - date ordinal per row (int32), 0 when the birthday is not set.
+    The footer is FOOTER_MARK, the offsets of the row groups (uint64 each), their number (uint32)
+    and COLUMNAR_MAGIC again. All integers are little-endian.
+    """
+
+    extension = 'abcol'
+    chunk_records = ROW_GROUP
+
+    def __init__(self, fh) -> None:
+        super().__init__(fh)
+        self._offset = 0
+        self._groups = []
+
+    def write(self, data: bytes) -> None:
+        self._offset += len(data)
+        super().write(data)
+
+    def header(self) -> bytes:
+        return COLUMNAR_MAGIC
+
+    def format_chunk(self, records: list) -> tuple[int, bytes]:
+        """Encodes the records as one row group."""
+
+        names = _string_column([record.name.value for record in records])
+        phones = (_pack('H', [len(record.phones) for record in records])
+                  + _string_column([phone.value for record in records for phone in record.phones]))
+        birthdays = _pack('i', [record.birthday.value.toordinal() if record.birthday else 0 for record in records])
+
+        return len(records), b''.join([ROW_GROUP_MARK, struct.pack('<I', len(records)),
+                                       struct.pack('<Q', len(names)), names,
+                                       struct.pack('<Q', len(phones)), phones,
+                                       struct.pack('<Q', len(birthdays)), birthdays])
+
+    def write_formatted(self, data: bytes) -> None:
+        self._groups.append(self._offset)
+        self.write(data)
+
+    def footer(self) -> bytes:
+        return (FOOTER_MARK + _pack('Q', self._groups)
+                + struct.pack('<I', len(self._groups)) + COLUMNAR_MAGIC)
+
+
+def _read_exactly(fh, size: int) -> bytes:
+    data = fh.read(size)
+    if len(data) != size:
+        raise ValueError("The columnar file is truncated")
+    return data
+
+
+def _read_array(code: str, data: bytes) -> tuple[int, ...]:
+    """Unpacks a little-endian array written by _pack."""
+
+    return struct.unpack(f'<{len(data) // struct.calcsize(code)}{code}', data)
+
+
+def _read_strings(data: bytes, count: int) -> list[str]:
+    lengths = _read_array('I', data[:count * 4])
+    strings, position = [], count * 4
+    for length in lengths:
+        strings.append(data[position:position + length].decode('utf-8'))
+        position += length
+    return strings
+
+
+def read_columnar(path: str) -> Iterator[dict]:
+    """
+    Read a file written by ColumnarWriter, one row group in memory at a time.
+
+    Args:
+        path (str): The path to the file, possibly gzip-compressed.
+
+    Yields:
+        dict: The name, phones and birthday (ISO date or None) of every record.
+    """
+
+    with open_input(path) as fh:
+        if fh.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError("Not a columnar address book file")
+
+        while _read_exactly(fh, 2) == ROW_GROUP_MARK:
+            rows, = struct.unpack('<I', _read_exactly(fh, 4))
+            columns = []
+            for _ in range(3):
+                size, = struct.unpack('<Q', _read_exactly(fh, 8))
+                columns.append(_read_exactly(fh, size))
+
+            names = _read_strings(columns[0], rows)
+            counts = _read_array('H', columns[1][:rows * 2])
+            phones = iter(_read_strings(columns[1][rows * 2:], sum(counts)))
+            birthdays = _read_array('i', columns[2])
+
+            for name, count, birthday in zip(names, counts, birthdays):
+                yield {'name': name,
+                       'phones': [next(phones) for _ in range(count)],
+                       'birthday': date.fromordinal(birthday).isoformat() if birthday else None}
+
+
+WRITERS = {'csv': CsvWriter,
+           'jsonl': JsonLinesWriter,
+           'vcard': VCardWriter,
+           'columnar': ColumnarWriter}
+
+
+def export(records: Iterable, path: str, fmt: str = 'csv', compress: bool = False, workers: int = None) -> int:
+    """
+    Stream records to a file.
+
+    Only a few chunks of records and of output (row groups for the columnar format) are kept in memory,
+    so a generator of records can be exported whatever its length.
+
+    Args:
+        records (Iterable[Record] | AddressBook): The records, or an address book to export in alphabetical order.
+        path (str): The path to the file.
+        fmt (str, optional): One of the keys of WRITERS. Defaults to 'csv'.
+        compress (bool, optional): Compress with gzip. Always done if the path ends with .gz. Defaults to False.
+        workers (int, optional): The number of processes formatting the records. Defaults to parallel.WORKERS.
+
+    Returns:
+        int: The number of records written.
+    """
+
+    with open_output(path, compress) as fh:
+        return WRITERS[fmt](fh).write_all(records, workers)
@@ -0,0 +1,243 @@
+from address_book import AddressBook, OperationResult
+from collections import deque
+from collections.abc import Iterable
+from locking import locked, replaced
+import events
+import json
+import os
+import uuid
+
+HISTORY = 100
+CHECKPOINT = 200
+BLOCK = 4096
+
+
+def replay(lines: list[str]) -> tuple[deque, list]:
+    """
+    Rebuild the undo and redo stacks from the lines of a history log.
+
+    A line is one of:
+        {"checkpoint": {"done": [group, ...], "undone": [group, ...]}}
+        {"do": group}
+        {"undo": id}
+        {"redo": id}
+    where a group is {"id": ..., "command": ..., "events": [...]}, the changes made by one command.
+    Lines that cannot be parsed, e.g. the last one if the program crashed while appending it, are skipped.
+
+    Args:
+        lines (list[str]): The lines of the log, oldest first.
+
+    Returns:
+        tuple[deque, list]: The groups that can be undone and the groups that can be redone, most recent last.
+    """
+
+    done, undone = deque(maxlen=HISTORY), []
+
+    def move(group_id: str, source, target) -> None:
+        for group in reversed(source):
+            if group['id'] == group_id:
+                source.remove(group)
+                target.append(group)
+                return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if 'checkpoint' in entry:
+            done = deque(entry['checkpoint']['done'], maxlen=HISTORY)
+            undone = entry['checkpoint']['undone']
+        elif 'do' in entry:
+            done.append(entry['do'])
+            undone.clear()
+        elif 'undo' in entry:
+            move(entry['undo'], done, undone)
+        elif 'redo' in entry:
+            move(entry['redo'], undone, done)
+
+    return done, undone
+
+
+def _line_start(fh, end: int) -> int:
+    """Returns the offset of the line that ends at end, reading the binary file backwards BLOCK bytes at a time."""
+
+    position = end
+    while position > 0:
+        size = min(BLOCK, position)
+        position -= size
+        fh.seek(position)
+        newline = fh.read(size).rfind(b'\n')
+        if newline >= 0:
+            return position + newline + 1
+
+    return 0
+
+
+class History:
+    """
+    Undo and redo of the commands, kept as the events they published rather than copies of the book.
+
+    Undoing a command applies the inverse of its events in reverse order, so it costs as much as the
+    command did, whatever the size of the book. The last HISTORY commands are kept. Every change of the
+    stacks is appended to a log, which is compacted into a single checkpoint line once it grows by CHECKPOINT lines,
+    so the history survives restarts. Several processes may share the log; they append to it under a lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Load the history log and start collecting the events of the address book.
+
+        Args:
+            path (str): The path to the history log.
+        """
+
+        self.path = path
+        self.current = []
+        self.lines = 0
+        self._applying = False
+        self.done, self.undone = self._read()
+        events.bus.subscribe(self)
+
+    def __call__(self, event: dict) -> None:
+        """Collect an event of the running command. The events of undo and redo themselves are not collected."""
+
+        if not self._applying:
+            self.current.append(event)
+
+    def _read(self) -> tuple[deque, list]:
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                lines = fh.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        self.lines = len(lines)
+        return replay(lines)
+
+    def _log(self, entries: list[dict]) -> None:
+        """
+        Append entries to the log and sync it, compacting the log if it has grown enough since the last checkpoint.
+
+        A partial last line left by a crash is cut off first, so the new entries start on a line of their own.
+        Only the last byte is read to tell, and the file is read backwards only when there is such a line.
+        """
+
+        data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+        with locked(self.path):
+            with open(self.path, 'ab+') as fh:
+                end = fh.seek(0, os.SEEK_END)
+                if end:
+                    fh.seek(end - 1)
+                    if fh.read(1) != b'\n':
+                        fh.truncate(_line_start(fh, end))
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            self.lines += len(entries)
+            if self.lines > len(self.done) + len(self.undone) + CHECKPOINT:
+                self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        """
+        Replace the log with one line holding the stacks it describes. Must be called under the lock.
+
+        The stacks are rebuilt from the log rather than taken from memory, so the entries appended by other processes are kept.
+        """
+
+        done, undone = self._read()
+        line = json.dumps({'checkpoint': {'done': list(done), 'undone': undone}}, ensure_ascii=False) + '\n'
+
+        with replaced(self.path, 'w', encoding='utf-8') as fh:
+            fh.write(line)
+
+        self.lines = 1
+
+    def commit(self, command: str) -> None:
+        """
+        Record the events collected since the last commit as one command that can be undone.
+
+        Args:
+            command (str): The command line, shown when the command is undone or redone.
+        """
+
+        if not self.current:
+            return
+
+        group = {'id': uuid.uuid4().hex, 'command': command, 'events': self.current}
+        self.current = []
+        self.done.append(group)
+        self.undone.clear()
+        self._log([{'do': group}])
+
+    def discard(self, dropped: Iterable[dict]) -> None:
+        """
+        Forget collected events that were not saved, e.g. those that conflicted with another process,
+        so undoing the command does not revert changes it did not make.
+
+        Args:
+            dropped (Iterable[dict]): The events, as published on the event bus.
+        """
+
+        dropped = {id(event) for event in dropped}
+        self.current = [event for event in self.current if id(event) not in dropped]
+
+    def _apply(self, book: AddressBook, group: dict, revert: bool) -> list[OperationResult]:
+        if revert:
+            changes = [events.inverse(event) for event in reversed(group['events'])]
+        else:
+            changes = group['events']
+
+        self._applying = True
+        try:
+            return book.apply_batch(op for event in changes for op in events.to_operations(event))
+        finally:
+            self._applying = False
+
+    def undo(self, book: AddressBook, n: int = 1) -> list[tuple[str, list[OperationResult]]]:
+        """
+        Revert the last n commands, most recent first.
+
+        Args:
+            book (AddressBook): The address book to change.
+            n (int, optional): The number of commands. Defaults to 1.
+
+        Returns:
+            list[tuple[str, list[OperationResult]]]: The command lines and the results of reverting them.
+        """
+
+        reverted, entries = [], []
+        while self.done and len(reverted) < n:
+            group = self.done.pop()
+            reverted.append((group['command'], self._apply(book, group, revert=True)))
+            self.undone.append(group)
+            entries.append({'undo': group['id']})
+
+        if entries:
+            self._log(entries)
+        return reverted
+
+    def redo(self, book: AddressBook, n: int = 1) -> list[tuple[str, list[OperationResult]]]:
+        """
+        Repeat the last n undone commands, in the order they were made.
+
+        Args:
+            book (AddressBook): The address book to change.
+            n (int, optional): The number of commands. Defaults to 1.
+
+        Returns:
+            list[tuple[str, list[OperationResult]]]: The command lines and the results of repeating them.
+        """
+
+        repeated, entries = [], []
+        while self.undone and len(repeated) < n:
+            group = self.undone.pop()
+            repeated.append((group['command'], self._apply(book, group, revert=False)))
+            self.done.append(group)
+            entries.append({'redo': group['id']})
+
+        if entries:
+            self._log(entries)
+        return repeated
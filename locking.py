@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def locked(path: str):
+    """
+    Hold an exclusive advisory lock on path + '.lock' for the duration of the with block.
+
+    Only writers take the lock. Files are replaced atomically, so readers never need it.
+
+    Args:
+        path (str): The path to the file being written.
+    """
+
+    with open(path + '.lock', 'a+b') as fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _file_mode(path: str) -> int:
+    """Returns the permissions of the file, or the default ones of a new file if it does not exist."""
+
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def replaced(path: str, mode: str = 'wb', encoding: str = None):
+    """
+    Write a file atomically: the with block writes a temporary file which then replaces the old one.
+
+    The new file keeps the permissions of the old one (or gets the default ones), not the 0600 of a temporary file.
+
+    Args:
+        path (str): The path to the file.
+        mode (str, optional): 'wb' or 'w'. Defaults to 'wb'.
+        encoding (str, optional): The encoding of a text file. Defaults to None.
+
+    Yields:
+        The temporary file, open for writing.
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as fh:
+            yield fh
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(temp_path, _file_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
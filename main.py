@@ -1,84 +1,145 @@
 import sys
 import os
 from address_book import *
-import pickle
+from dedupe import find_duplicates, merge_duplicates
+from export import WRITERS
+from history import History
+from presentation import RENDERERS
+from storage import Storage
+import argparse
+import events
+import memory
+import parallel
 import re
+import tracemalloc
 from exceptions import *
 
 
 
 USERS_FILE = 'users.bin'
 USERS_CSV_FILE = 'users.csv'
+HISTORY_FILE = 'users.history'
 ab = AddressBook()
+store = None
+history = None
 
 
-def start(file_name: str = USERS_FILE) -> str:
+def start(file_name: str = USERS_FILE) -> Result:
     """
     Starts the address book application.
     Opens the address book file and loads the users into memory.
+    Other processes may use the same file; their changes are merged when saving.
+    The history of the commands is loaded from HISTORY_FILE, so they can be undone after a restart.
 
     Args:
         file_name (str): The name of the file to load the address book from. Defaults to 'users.bin'.
 
     Returns:
-        str: The manual message.
+        Result: The manual message.
 
     """
 
-    file_path =  os.path.join(os.getcwd(), file_name)
-    if os.path.exists(file_path):
-        global ab
-        ab = load_users(file_path)
+    global ab, store, history
+    store = Storage(os.path.join(os.getcwd(), file_name))
+    history = History(os.path.join(os.getcwd(), HISTORY_FILE))
+    ab = load_users()
 
     return manual()
 
 
-def show_all(*_) -> str:
-    """Displays all users in the address book.
+@input_error
+def show_all(args: list[str]) -> Result:
+    """Displays all users in the address book in alphabetical order.
+
+    Args:
+        args (list[str]): Empty, or 'from' followed by the name to start from.
 
     Returns:
-        str: The string representation of all users in the address book.
+        Result: The users in the address book.
     """
-    if ab:
-        return '\n'.join([user for user in ab])
-    return "The address book is empty"
+    if not ab:
+        return Result("The address book is empty")
 
+    if not args:
+        return Result(data=ab)
 
-def load_users(path: str = USERS_FILE) -> AddressBook:
-    """Loads the address book from a file.
+    if args[0] != 'from':
+        return Result.failure("Please enter 'show all' or 'show all from <name>'")
 
-    Args:
-        path (str): The path to the file. Defaults to 'users.bin'.
+    start = ' '.join(args[1:])
+    if not start:
+        raise EmptyUsernameError
+
+    if next(ab.names(start), None) is None:
+        return Result(f"There are no users after {start}")
+
+    return Result(data=ab.pages(start))
+
+
+def load_users() -> AddressBook:
+    """Loads the address book from the users file.
 
     Returns:
-        AddressBook: The loaded address book.
+        AddressBook: The loaded address book, empty if the file does not exist yet.
     """
 
-    with open(path, 'rb') as file:
+    with memory.tracker.track('load_users'):
 
-        return pickle.load(file)
+        return store.load()
 
 
-def save_users(path: str = USERS_FILE) -> None:
-    """Saves the address book to a file.
+def refresh_users() -> None:
+    """Picks up the changes other processes saved to the users file since it was loaded or saved."""
 
-    Args:
-        path (str): The path to the file. Defaults to 'users.bin'.
+    global ab
+    ab = store.refresh(ab)
+
+
+def save_users() -> Result | None:
+    """Saves the changes of the address book to the users file.
 
+    If another process saved the file in the meantime, the changes are replayed on its version.
+
+    Returns:
+        Result | None: A warning about the changes that could not be replayed, otherwise None.
     """
 
-    with open(path, 'wb') as file:
-        pickle.dump(ab, file)
+    global ab
+    with memory.tracker.track('save_users'):
+        ab = store.save(ab)
+
+    if store.conflicts:
+        history.discard(event for event, _ in store.conflicts)
+        conflicts = [f"{event['type']} {event['name']}: {error}" for event, error in store.conflicts]
+        store.conflicts.clear()
+        return Result.failure("Some changes conflicted with changes saved by another process and were skipped:",
+                              data=conflicts)
+
 
+def save_in_format(args: list[str]) -> Result:
+    """Additionally saves all contacts in one of the export formats.
+
+    Args:
+        args (list[str]): The format and, optionally, the path to the file.
+
+    Returns:
+        Result: The report message.
+    """
+
+    if not args or args[0] not in WRITERS:
+        return Result.failure(f"Please enter one of the formats: {', '.join(WRITERS)}")
 
-def save_in_csv(*_) -> str:
     if not ab:
-        return "Address book is empty"
+        return Result("Address book is empty")
 
-    file_name = USERS_CSV_FILE
+    fmt = args[0]
+    file_name = ' '.join(args[1:]) or (USERS_CSV_FILE if fmt == 'csv' else f"users.{WRITERS[fmt].extension}")
     ful_path =  os.path.join(os.getcwd(), file_name)
-    report = ab.save(ful_path)
-    return report[:-1] +  f" to the file {file_name}."
+    try:
+        ab.save(ful_path, fmt)
+    except OSError as err:
+        return Result.failure(f"The Address book could not be saved: {err.strerror or err}", file_name)
+    return Result(f"The Address book was saved successfully to the file {file_name}.")
 
 
 def separates_name(args: list[str]) -> tuple[str, list[str]]:
@@ -102,15 +163,37 @@ def separates_name(args: list[str]) -> tuple[str, list[str]]:
     return name, not_name
 
 
+BATCH_MESSAGES = {'add user': "User added successfully.",
+                  'add phone': "Phone number added successfully.",
+                  'add birthday': "Birthday added successfully."}
+
+
+def parse_date(text: str) -> datetime:
+    """Parses a date in the format YYYY-MM-DD with any of the separators .,-/_.
+
+    Args:
+        text (str): The date to parse.
+
+    Returns:
+        datetime: The parsed date.
+
+    Raises:
+        ValueError: If the text is not a valid date.
+    """
+
+    y, m, d = map(int, re.split(r'[.,-/_]', text))
+    return datetime(y, m, d)
+
+
 @input_error
-def add_new_user(args: list[str]) -> str:
+def add_new_user(args: list[str]) -> list[Result]:
     """Adds a new user to the address book.
 
     Args:
         args (List[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        list[Result]: The outcome for the user and for each of the phones and dates.
 
     """
 
@@ -122,39 +205,47 @@ def add_new_user(args: list[str]) -> str:
     if name in ab:
         raise AddingExistingUser
 
-
-    ab.add_record(Record(Name(name)))
-    report = f"{color(name, 'c')} - User added successfully.\n"
+    ops = [('add user', name)]
+    tokens = []
 
     for obj in not_name:
-
-        result = add_phone([name, obj])
-        if result == f"{color(obj, 'c')} - Phone number added successfully.\n":
-            report += result
-            continue
-        if result == f"{color(obj, 'r')} - This user already has this phone number.\n":
-            report += result
-            continue
-
-        result = add_birthday([name, obj])
-        if result == f"{color(obj, 'c')} - Birthday added successfully.\n":
-            report += result
+        if Phone(obj).value:
+            op = ('add phone', name, obj)
+        else:
+            try:
+                op = ('add birthday', name, parse_date(obj))
+            except ValueError:
+                op = None
+        tokens.append((obj, op))
+        if op:
+            ops.append(op)
+
+    results = iter(ab.apply_batch(ops))
+    next(results)
+    report = [Result(BATCH_MESSAGES['add user'], name)]
+
+    for obj, op in tokens:
+        if not op:
+            report.append(Result.failure("Format is incorrect.", obj))
             continue
 
-        result = "Format is incorrect."
-        report += f"{color(obj, 'r')} - {result}\n"
+        result = next(results)
+        if result.ok:
+            report.append(Result(BATCH_MESSAGES[op[0]], obj))
+        else:
+            report.append(Result.failure(result.error, obj))
 
     return report
 
 @input_error
-def remove_user(args: list[str]) -> str:
+def remove_user(args: list[str]) -> Result:
     """Removes a user from the address book.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        Result: The report message.
 
     """
 
@@ -168,18 +259,18 @@ def remove_user(args: list[str]) -> str:
 
     del ab[name]
 
-    return "User deleted successfully"
+    return Result("User deleted successfully")
 
 
 @input_error
-def add_phone(args: list[str]) -> str:
+def add_phone(args: list[str]) -> list[Result]:
     """Adds a phone number to an existing user.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        list[Result]: The outcome for each of the phones.
     """
 
     name, phones  = separates_name(args)
@@ -193,24 +284,27 @@ def add_phone(args: list[str]) -> str:
     if not phones:
         raise EmptyPhoneError
 
-    report = ''
+    report = []
 
     for phone in phones:
-        result = ab[name].add_phone(Phone(phone))
-        status = 'c' if result == "Phone number added successfully." else 'r'
-        report += f"{color(phone, status)} - {result}\n"
+        try:
+            ab[name].add_phone(Phone(phone))
+        except (AddingExistingPhone, InvalidPhoneNumber) as err:
+            report.append(Result.failure(err, phone))
+        else:
+            report.append(Result("Phone number added successfully.", phone))
 
     return report
 
 @input_error
-def change_phone(args: list[str]) -> str:
+def change_phone(args: list[str]) -> Result:
     """Changes a phone number of a user.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        Result: The report message.
     """
 
     name, phones = separates_name(args)
@@ -224,21 +318,21 @@ def change_phone(args: list[str]) -> str:
     if len(phones) == 2:
         old_phone, new_phone = phones
     else:
-        return "Please enter old and new phone numbers without spaces"
+        return Result.failure("Please enter old and new phone numbers without spaces")
 
-    report = ab[name].edit_phone(Phone(old_phone), Phone(new_phone))
+    ab[name].edit_phone(Phone(old_phone), Phone(new_phone))
 
-    return report
+    return Result("The phone number has been changed successfully.")
 
 @input_error
-def show_phone(args: list[str]) -> str:
+def show_phone(args: list[str]) -> Result:
     """Displays all phone numbers of a user.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The string representation of phone numbers.
+        Result: The phone numbers of the user.
     """
 
     name, _ = separates_name(args)
@@ -250,24 +344,20 @@ def show_phone(args: list[str]) -> str:
         raise NonExistentUser
 
     if not ab[name].phones:
-        return f"There are no phone number records for the user {name}"
-
-    result = ''
-    for phone in ab[name].phones:
-        result += phone.value + '\n'
+        return Result(f"There are no phone number records for the user {name}")
 
-    return result
+    return Result(data=[phone.value for phone in ab[name].phones])
 
 
 @input_error
-def remove_phone(args: list[str]) -> str:
+def remove_phone(args: list[str]) -> list[Result]:
     """Removes a phone number from an existing user.
 
     Args:
         args (List[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        list[Result]: The outcome for each of the phones.
     """
 
     name, phones = separates_name(args)
@@ -281,25 +371,27 @@ def remove_phone(args: list[str]) -> str:
     if not phones:
         raise EmptyPhoneError
 
-    report = ''
+    report = []
     for phone in phones:
-
-        result = ab[name].remove_phone(Phone(phone))
-        sratus = 'c' if result == "Phone number deleted successfully." else 'r'
-        report += f"{color(phone, sratus)} - {result}\n"
+        try:
+            ab[name].remove_phone(Phone(phone))
+        except NonExistentPhone as err:
+            report.append(Result.failure(err, phone))
+        else:
+            report.append(Result("Phone number deleted successfully.", phone))
 
     return report
 
 
 @input_error
-def add_birthday(args: list[str]) -> str:
+def add_birthday(args: list[str]) -> Result:
     """Adds a birthday to an existing user.
 
     Args:
         args (List[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        Result: The report message.
     """
 
     name, birthday  = separates_name(args)
@@ -314,25 +406,27 @@ def add_birthday(args: list[str]) -> str:
         raise EmptyBirthdayError
 
     try:
-        y, m, d = map(int, re.split(r'[.,-/_]', birthday[0]))
+        date = parse_date(birthday[0])
     except ValueError:
-        return f"{color(birthday[0], 'r')} - Birthday format is incorrect. The date should be in the format YYYY-MM-DD."
-    report = ab[name].add_birthday(Birthday(datetime(y, m, d)))
-    status = 'c' if report == "Birthday added successfully." else 'r'
+        return Result.failure("Birthday format is incorrect. The date should be in the format YYYY-MM-DD.", birthday[0])
 
+    try:
+        ab[name].add_birthday(Birthday(date))
+    except (InvalidBirthday, AddingExistingBirthday) as err:
+        return Result.failure(err, birthday[0])
 
-    return  f"{color(birthday[0], status)} - {report}"
+    return Result("Birthday added successfully.", birthday[0])
 
 
 @input_error
-def show_birthday(args: list[str]) -> str:
+def show_birthday(args: list[str]) -> Result:
     """Displays the birthday of a user.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The birthday of the user in the format 'DD.MM.YYYYр'.
+        Result: The birthday of the user.
     """
 
     name, _ = separates_name(args)
@@ -344,20 +438,20 @@ def show_birthday(args: list[str]) -> str:
         raise NonExistentUser
 
     if not ab[name].birthday:
-        return f"There are no birthday record for the user {name}"
+        return Result(f"There are no birthday record for the user {name}")
 
-    return ab[name].birthday.value.strftime("%d.%m.%Yp")
+    return Result(data=ab[name].birthday.value)
 
 
 @input_error
-def birthday_countdown(args: list[str]) -> str:
+def birthday_countdown(args: list[str]) -> Result:
     """Displays the number of days until the next birthday of a user.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The number of days until the next birthday.
+        Result: The number of days until the next birthday.
 
     """
 
@@ -369,19 +463,20 @@ def birthday_countdown(args: list[str]) -> str:
     if name not in ab:
         raise NonExistentUser
 
-    days = ab[name].days_to_birthday() if ab[name].birthday else 'Is not known'
-    return f"{days} days remain until the birthday of the user {name}"
+    days = ab[name].days_to_birthday()
+    return Result(f"{days if days is not None else 'Is not known'} days remain until the birthday of the user {name}",
+                  data=days)
 
 
 @input_error
-def remove_birthday(args: list[str]) -> str:
+def remove_birthday(args: list[str]) -> Result:
     """Removes the birthday of a user.
 
     Args:
         args (list[str]): List of string arguments.
 
     Returns:
-        str: The report message.
+        Result: The report message.
     """
 
     name, _  = separates_name(args)
@@ -393,139 +488,227 @@ def remove_birthday(args: list[str]) -> str:
         raise NonExistentUser
 
     if not ab[name].birthday:
-        return f"There are no birthday record for the user {name}"
+        return Result(f"There are no birthday record for the user {name}")
 
-    ab[name].birthday = None
+    ab[name].remove_birthday()
 
-    return "Birthday deleted successfully."
+    return Result("Birthday deleted successfully.")
 
 
 
-def find(args: list[str]) -> str:
-    """Searches for users by part of their name or phone number.
+@input_error
+def find(args: list[str]) -> Result:
+    """Searches for users with a query, or shows how the query would run if it starts with 'explain'.
 
     Args:
-        args (list[str]): List of string arguments.
+        args (list[str]): The words of the query, see query.Query.
 
     Returns:
-        str: The search result.
+        Result: The users found, or the steps of the plan.
     """
 
+    if args[:1] == ['explain']:
+        return Result("Plan:", data=ab.explain(' '.join(args[1:])))
+
     found_users = ab.search(' '.join(args))
-    result = ''
     if found_users:
-        for page in found_users:
-            result += page
-        return result
-    return "Nothing was found for your request"
+        return Result(data=found_users)
+    return Result("Nothing was found for your request")
 
 
-def hello(*_) -> str:
-    """Displays a welcome message.
+def dedupe(args: list[str]) -> Result:
+    """Finds users that are probably duplicates of each other and optionally merges them.
+
+    Only the users with similar names are merged automatically. A shared phone number alone,
+    e.g. a family landline, is only suggested.
+
+    Args:
+        args (list[str]): Optionally 'merge' and the number of worker processes.
+
+    Returns:
+        Result: The merge suggestions, or the merges that were made.
+    """
+
+    merge = 'merge' in args
+    workers = next((int(arg) for arg in args if arg.isdigit()), parallel.WORKERS)
+
+    suggestions = find_duplicates(ab, workers)
+    if not suggestions:
+        return Result("No duplicates were found")
+
+    if merge:
+        merged = merge_duplicates(ab, [suggestion for suggestion in suggestions if 'name' in suggestion.reasons])
+        return Result(f"{len(merged)} users were merged:", data=merged)
+
+    return Result(f"{len(suggestions)} possible duplicates (duplicate -> user to keep):", data=suggestions)
+
+
+def memory_stats(*_) -> Result:
+    """Displays how much memory the address book uses.
 
     Returns:
-        str: The welcome message.
+        Result: The sizes of the parts of the address book and, if memory is traced,
+            the allocations of the last load and save of the users file.
     """
 
-    return "How can I help you?"
+    report = memory.book_memory(ab)
+    if memory.tracker.snapshots:
+        report['tracemalloc'] = memory.tracker.snapshots
 
+    return Result("Memory used by the address book:", data=report, kind='stats')
 
-def color(text: str, status: str = 'c') -> str:
-    """Adds color to the text based on the status.
+
+def check_memory(limit: float) -> Result | None:
+    """Compacts the address book if it uses more memory than the limit.
+
+    Args:
+        limit (float): The limit in megabytes.
+
+    Returns:
+        Result | None: A warning if the limit was exceeded, otherwise None.
+    """
+
+    used = memory.book_memory(ab)['total']
+    if used <= limit * 2 ** 20:
+        return None
+
+    saved = memory.compact(ab)
+    return Result.failure(f"The address book uses {used / 2 ** 20:.2f} MB, more than the limit of {limit} MB. "
+                          f"It was compacted, {saved / 2 ** 20:.2f} MB were freed.")
+
+
+def undo_redo(args: list[str], redo: bool = False) -> list[Result] | Result:
+    """Undoes or redoes the last commands that changed the address book.
 
     Args:
-        text (str): The text to color.
-        status (str): The status of the text. Defaults to 'c'.
-            h - heading;
-            r - required;
-            o - optional;
-            c - command.
+        args (list[str]): Empty, or the number of commands.
+        redo (bool, optional): Redo instead of undo. Defaults to False.
 
     Returns:
-        str: The colored text.
+        list[Result] | Result: One result per command, or why nothing was done.
     """
 
-    match status:
-        case 'h':
-            text = '\033[1m' + text + '\033[0m'
-        case 'r':
-            text = '\033[31m' + text + '\033[0m'
-        case 'o':
-            text = '\033[3m\033[34m' + text + '\033[0m'
-        case 'c':
-            text = '\033[32m' + text + '\033[0m'
+    action, done = ('redo', 'redone') if redo else ('undo', 'undone')
+    if args and not (len(args) == 1 and args[0].isdigit() and int(args[0]) > 0):
+        return Result.failure(f"Please enter '{action}' or '{action} <number of commands>'")
+
+    n = int(args[0]) if args else 1
+    commands = history.redo(ab, n) if redo else history.undo(ab, n)
+    if not commands:
+        return Result(f"There is nothing to {action}")
+
+    results = []
+    for command, outcome in commands:
+        errors = [f"{result.op[0]} {result.op[1]}: {result.error}" for result in outcome if not result.ok]
+        if errors:
+            results.append(Result.failure(f"Partly {done}, skipped: {'; '.join(errors)}", command))
+        else:
+            results.append(Result(f"{done.capitalize()} successfully.", command))
+
+    return results
+
+
+def undo(args: list[str]) -> list[Result] | Result:
+    """Undoes the last command, or the last n commands, that changed the address book."""
+
+    return undo_redo(args)
+
+
+def redo(args: list[str]) -> list[Result] | Result:
+    """Redoes the last undone command, or the last n undone commands."""
 
-    return text
+    return undo_redo(args, redo=True)
+
+
+def hello(*_) -> Result:
+    """Displays a welcome message.
+
+    Returns:
+        Result: The welcome message.
+    """
 
+    return Result("How can I help you?")
 
-def manual(*_) -> str:
+
+def manual(*_) -> Result:
     """Displays the manual for the address book application.
 
     Returns:
-        str: The manual message.
+        Result: The manual message.
+    """
+
+    return Result(kind='manual')
+
+
+def parse_arguments(argv: list[str] = None) -> argparse.Namespace:
+    """Parses the command line arguments.
+
+    Args:
+        argv (list[str], optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
     """
 
-    message = f'''
-{color('Address Book', 'h')}
-It is a simple address book application that allows users to manage their contacts,
-including adding users, adding phone numbers, adding birthdays, and searching for contacts.
-The program uses a command-line interface for interaction.
-
-{color('Commands', 'h')}
-{color("add user", 'c')} {color('<name>', 'r')} {color('[phone1] [phone2] [birthday]', 'o')} ...: Add a new user to the address book.
-{color("remove user", 'c')} {color('<name>', 'r')}: Deleting a user from the address book.
-
-{color('add phone', 'c')} {color('<name> <phone1>', 'r')} {color('[phone2]', 'o')} ...: Add a phone number to an existing user.
-{color('change phone', 'c')} {color('<name> <old_phone> <new_phone>', 'r')}: Change a phone number of a user.
-{color('show phone', 'c')} {color('<name>', 'r')}: Show all phone numbers of a user.
-{color('remove phone', 'c')} {color('<name> <phone1>', 'r')} {color('[phone2]', 'o')} ...: Deleting the phone number from an existing user.
-
-{color('add birthday', 'c')} {color('<name> <date>', 'r')}: Add a birthday to an existing user.
-{color('change birthday', 'c')} {color('<name> <date>', 'r')}: Change the birthday of a user.
-{color('show birthday', 'c')} {color('<name>', 'r')}: Show the birthday of a user.
-{color('when birthday', 'c')} {color('<name>', 'r')}: Show the number of days until the next birthday of a user.
-{color('remove birthday', 'c')} {color('<name>', 'r')}: Deleting date of birth from an existing user.
-
-{color('find', 'c')} {color('<query>', 'r')}: Search for users by part of their name or phone number.
-{color('show all', 'c')}: Show all users in the address book.
-{color('hello', 'c')}: Display a welcome message.
-{color('help', 'c')}: Show the list of available commands.
-{color('save csv', 'c')}: Additionally save all contacts in csv format.
-To exit the program, you can use one of the following commands: \
-{color('exit', 'c')}, {color('close', 'c')}, {color('goodbye', 'c')}, {color('quit', 'c')}, or {color('q', 'c')}.
-
-Note:
-• Parameters enclosed in {color('<angle brackets>', 'r')} and {color('[square brackets]', 'o')} \
-are placeholders that should be replaced with the actual values.
-• Parameters enclosed in {color('<angle brackets>', 'r')} are required and must be provided.
-• Parameters enclosed in {color('[square brackets]', 'o')} are optional and can be omitted.
-• Name must not contain numbers.
-• Phone numbers and birthdates should be entered without spaces in between the digits, allowing separators: {color('.,-/_', 'o')}.
-• The date should be in the format YYYY-MM-DD.
-    '''
-    return message
-
-
-
-def main() -> None:
+    parser = argparse.ArgumentParser(description="Address book")
+    parser.add_argument('--output', choices=RENDERERS, default='terminal',
+                        help="How to present the results of the commands. Defaults to terminal.")
+    parser.add_argument('--events', metavar='PATH',
+                        help="Append every change of the address book to this newline-delimited JSON file.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="The number of processes formatting 'show all', 'save' and comparing in 'dedupe'. "
+                             "Defaults to 1.")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Trace the memory allocated while loading and saving the users file, see 'stats memory'.")
+    parser.add_argument('--memory-limit', type=float, metavar='MB',
+                        help="Warn and compact the address book if it uses more memory than this after loading.")
+
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> None:
     """Main function to handle user inputs and execute commands."""
 
-    print(start())
+    arguments = parse_arguments(argv)
+    render = RENDERERS[arguments.output]
+    prompt = '>>> ' if arguments.output == 'terminal' else ''
+    parallel.WORKERS = arguments.workers
+
+    def show(result: Result | list[Result]) -> None:
+        text = render(result)
+        if isinstance(text, str):
+            if text:
+                print(text)
+            return
+        for chunk in text:
+            print(chunk, flush=True)
+
+    if arguments.trace_memory:
+        tracemalloc.start()
+
+    show(start())
+    if arguments.events:
+        store.subscribe(events.JsonlSink(arguments.events))
+    if arguments.memory_limit and (warning := check_memory(arguments.memory_limit)):
+        show(warning)
     while True:
 
-        command = input('>>> ').strip()
+        command = input(prompt).strip()
 
         if command.lower() in ("exit", "close", "goodbye", 'quit', 'q'):
-            print("Good bye!")
+            show(Result("Good bye!"))
             break
 
         args_list = command.split()
 
         if len(args_list) and (hands := args_list[0]) in handlers or (hands := ' '.join(args_list[:2])) in handlers:
-            print(handlers[hands](args_list[len(hands.split()):]))
-            save_users()
+            refresh_users()
+            show(handlers[hands](args_list[len(hands.split()):]))
+            if warning := save_users():
+                show(warning)
+            history.commit(command)
         else:
-            print(f"{color('Enter one of the commands:', 'r')} {', '.join(list(handlers.keys()))}.")
+            show(Result("Enter one of the commands:", ok=False, data=list(handlers), kind='commands'))
 
     sys.exit(0)
 
@@ -542,10 +725,14 @@ handlers = {'add user': add_new_user,
             'when birthday': birthday_countdown,
             'remove birthday': remove_birthday,
             'find': find,
+            'dedupe': dedupe,
+            'stats memory': memory_stats,
             'show all': show_all,
+            'undo': undo,
+            'redo': redo,
             'hello': hello,
             'help': manual,
-            'save csv': save_in_csv
+            'save': save_in_format
             }
 
 
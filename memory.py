@@ -0,0 +1,189 @@
+from address_book import AddressBook
+from contextlib import contextmanager
+from types import FunctionType, ModuleType
+import pickle
+import sys
+import tracemalloc
+
+TOP_ALLOCATIONS = 3
+SAMPLE = 1000
+
+
+def _slots(cls: type) -> list[str]:
+    """Returns the attribute names of the __slots__ of a class and its bases, private names mangled."""
+
+    names = []
+    for base in cls.__mro__:
+        slots = base.__dict__.get('__slots__', ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if slot.startswith('__') and not slot.endswith('__'):
+                slot = f"_{base.__name__.lstrip('_')}{slot}"
+            names.append(slot)
+
+    return names
+
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    """
+    Approximate the memory used by an object and everything it references.
+
+    Objects already in seen are not counted again, so sharing one seen set between calls
+    attributes every object to the first component that references it. The set holds an id per object,
+    so measure a sample rather than a whole large book, see book_memory.
+
+    Args:
+        obj: The object to measure.
+        seen (set, optional): The ids of the objects already counted. Defaults to None.
+
+    Returns:
+        int: The size in bytes.
+    """
+
+    if seen is None:
+        seen = set()
+
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, ModuleType, FunctionType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        stack.extend(getattr(obj, slot) for slot in _slots(type(obj)) if hasattr(obj, slot))
+
+    return size
+
+
+def book_memory(book: AddressBook, sample: int = SAMPLE) -> dict:
+    """
+    Report the approximate memory used by the parts of an address book.
+
+    The records are measured on a sample spread evenly over the name index and the sizes are scaled
+    to the whole book, so the report costs about the same and needs little memory whatever the size of the book.
+    The containers (the dictionary and the list of the name index) are measured exactly.
+
+    Args:
+        book (AddressBook): The address book.
+        sample (int, optional): The number of records to measure. Defaults to SAMPLE.
+
+    Returns:
+        dict: The counts of records, phones and birthdays, the average number of phones per record,
+            the number of records measured, the size in bytes of every component and of the whole book,
+            and the size of its pickle.
+    """
+
+    records = book.data.values()
+    entries = book._index[::max(1, len(book._index) // sample)]
+    scale = len(book._index) / len(entries) if entries else 0
+    items = [(name, book.data[name]) for _, name in entries]
+
+    seen = set()
+    measured = {
+        'names': sum(deep_sizeof(record.name, seen) + deep_sizeof(name, seen) for name, record in items),
+        'phones': sum(deep_sizeof(record.phones, seen) for _, record in items),
+        'birthdays': sum(deep_sizeof(record.birthday, seen) for _, record in items),
+        'records': sum(deep_sizeof(record, seen) for _, record in items),
+        'name index': sum(deep_sizeof(entry, seen) for entry in entries),
+    }
+    components = {key: round(size * scale) for key, size in measured.items()}
+    components['name index'] += sys.getsizeof(book._index)
+    components['dictionary'] = sys.getsizeof(book.data)
+    phones = sum(len(record.phones) for record in records)
+
+    return {'records': len(book.data),
+            'phones': phones,
+            'phones per record': round(phones / len(book.data), 2) if book.data else 0,
+            'birthdays': sum(1 for record in records if record.birthday),
+            'measured records': len(items),
+            'sizes': components,
+            'total': sum(components.values()),
+            'pickle': round(len(pickle.dumps(dict(items))) * scale)}
+
+
+def compact(book: AddressBook) -> int:
+    """
+    Make an address book use less memory without changing its content, in one pass over the records.
+
+    Names and phones are interned, so equal strings (e.g. a lower-case name and its index key)
+    share one object, and the dictionary and the phone lists lose their spare capacity. Cached birthdays are dropped.
+    Records and fields already have __slots__, which saves more than all of this.
+
+    Args:
+        book (AddressBook): The address book.
+
+    Returns:
+        int: The number of bytes freed, approximately: the sizes of the strings replaced by interned ones
+            and the spare capacity removed.
+    """
+
+    freed = 0
+
+    def interned(value: str) -> str:
+        nonlocal freed
+        canonical = sys.intern(value)
+        if canonical is not value:
+            freed += sys.getsizeof(value)
+        return canonical
+
+    data = {}
+    for name, record in book.data.items():
+        data[interned(name)] = record
+        record.name.value = interned(record.name.value)
+        for phone in record.phones:
+            phone.value = interned(phone.value)
+        phones = list(record.phones)
+        freed += sys.getsizeof(record.phones) - sys.getsizeof(phones)
+        record.phones = phones
+        record.birthday = record.birthday
+    freed += sys.getsizeof(book.data) - sys.getsizeof(data)
+    book.data = data
+    book._index = [(interned(key), interned(name)) for key, name in book._index]
+
+    return freed
+
+
+class MemoryTracker:
+    """Keeps tracemalloc measurements of the operations run inside track()."""
+
+    def __init__(self) -> None:
+        self.snapshots = {}
+
+    @contextmanager
+    def track(self, label: str):
+        """
+        Measure the memory allocated by the code in the with block, if tracemalloc is tracing.
+
+        Args:
+            label (str): The name of the operation, e.g. 'load_users'.
+        """
+
+        if not tracemalloc.is_tracing():
+            yield
+            return
+
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            stats = tracemalloc.take_snapshot().filter_traces(ignore).compare_to(before, 'lineno')
+            self.snapshots[label] = {
+                'allocated': sum(stat.size_diff for stat in stats),
+                'peak': peak,
+                'top': [{'line': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", 'size': stat.size_diff}
+                        for stat in stats[:TOP_ALLOCATIONS]],
+            }
+
+
+tracker = MemoryTracker()
@@ -0,0 +1,108 @@
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import events
+import multiprocessing
+
+WORKERS = 1
+
+_shared = None
+_pool = None
+_pool_workers = 0
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Splits the items into lists of up to size items, consuming them lazily."""
+
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def _stale(event: dict) -> None:
+    """Marks the pool as forked from an outdated copy of the shared object. Subscribed while a pool is alive."""
+
+    global _pool_workers
+    _pool_workers = 0
+    events.bus.unsubscribe(_stale)
+
+
+def shutdown() -> None:
+    """Stop the worker processes, if any."""
+
+    global _pool, _shared, _pool_workers
+    events.bus.unsubscribe(_stale)
+    if _pool is not None:
+        _pool.shutdown()
+    _pool, _shared, _pool_workers = None, None, 0
+
+
+def _pool_for(shared, workers: int) -> ProcessPoolExecutor:
+    """
+    Returns a pool of processes forked while _shared is the given object.
+
+    The pool is kept for the next calls until the object is replaced or the event bus reports a change,
+    so the processes are not started again for every command.
+    """
+
+    global _pool, _shared, _pool_workers
+    if _pool is not None and _shared is shared and _pool_workers == workers:
+        return _pool
+
+    shutdown()
+    _shared, _pool_workers = shared, workers
+    _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    events.bus.subscribe(_stale)
+    return _pool
+
+
+def _run(func: Callable, start: int, stop: int):
+    """Runs in a worker: applies func to the copy of the shared object inherited from the parent."""
+
+    return func(_shared, start, stop)
+
+
+def map_ranges(func: Callable[[object, int, int], object], shared, start: int, stop: int, chunk_size: int,
+               workers: int = None) -> Iterator:
+    """
+    Apply func(shared, i, j) to consecutive ranges [i, j) of chunk_size positions from start to stop.
+
+    With more than one worker the ranges are handled by forked processes that inherit shared, e.g. an
+    address book, so only the bounds of the ranges go to the workers and only the results come back.
+    Sending the records themselves would cost more than formatting them. Where fork is not available
+    (e.g. on Windows) func runs in this process. func must be picklable, i.e. a module-level function
+    or a functools.partial of one with small arguments.
+
+    The results come back in the order of the ranges and as soon as they are ready, with at most
+    two ranges per worker in flight.
+
+    Args:
+        func (Callable): Called with shared and the bounds of every range.
+        shared: The object the ranges index into.
+        start (int): The first position.
+        stop (int): The position after the last one.
+        chunk_size (int): The number of positions in a range.
+        workers (int, optional): The number of processes. Defaults to WORKERS.
+
+    Yields:
+        The results of func, one per range.
+    """
+
+    if workers is None:
+        workers = WORKERS
+
+    ranges = ((i, min(i + chunk_size, stop)) for i in range(start, stop, chunk_size))
+    if workers <= 1 or stop - start <= chunk_size or 'fork' not in multiprocessing.get_all_start_methods():
+        for i, j in ranges:
+            yield func(shared, i, j)
+        return
+
+    executor = _pool_for(shared, workers)
+    pending = deque()
+    for i, j in ranges:
+        pending.append(executor.submit(_run, func, i, j))
+        if len(pending) >= workers * 2:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,295 @@
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from functools import partial
+from address_book import AddressBook, Pages, Record
+from results import Result
+import json
+import parallel
+
+PAGES_PER_CHUNK = 100
+BYTE_KEYS = {'sizes', 'total', 'pickle', 'allocated', 'peak', 'size'}
+
+
+def color(text: str, status: str = 'c') -> str:
+    """Adds color to the text based on the status.
+
+    Args:
+        text (str): The text to color.
+        status (str): The status of the text. Defaults to 'c'.
+            h - heading;
+            r - required;
+            o - optional;
+            c - command.
+
+    Returns:
+        str: The colored text.
+    """
+
+    match status:
+        case 'h':
+            text = '\033[1m' + text + '\033[0m'
+        case 'r':
+            text = '\033[31m' + text + '\033[0m'
+        case 'o':
+            text = '\033[3m\033[34m' + text + '\033[0m'
+        case 'c':
+            text = '\033[32m' + text + '\033[0m'
+
+    return text
+
+
+def no_color(text: str, status: str = 'c') -> str:
+    """Returns the text unchanged. Drop-in replacement for color()."""
+
+    return text
+
+
+def manual(paint=color) -> str:
+    """Builds the manual for the address book application.
+
+    Args:
+        paint (function): The function used to highlight the text. Defaults to color.
+
+    Returns:
+        str: The manual message.
+    """
+
+    message = f'''
+{paint('Address Book', 'h')}
+It is a simple address book application that allows users to manage their contacts,
+including adding users, adding phone numbers, adding birthdays, and searching for contacts.
+The program uses a command-line interface for interaction.
+
+{paint('Commands', 'h')}
+{paint("add user", 'c')} {paint('<name>', 'r')} {paint('[phone1] [phone2] [birthday]', 'o')} ...: Add a new user to the address book.
+{paint("remove user", 'c')} {paint('<name>', 'r')}: Deleting a user from the address book.
+
+{paint('add phone', 'c')} {paint('<name> <phone1>', 'r')} {paint('[phone2]', 'o')} ...: Add a phone number to an existing user.
+{paint('change phone', 'c')} {paint('<name> <old_phone> <new_phone>', 'r')}: Change a phone number of a user.
+{paint('show phone', 'c')} {paint('<name>', 'r')}: Show all phone numbers of a user.
+{paint('remove phone', 'c')} {paint('<name> <phone1>', 'r')} {paint('[phone2]', 'o')} ...: Deleting the phone number from an existing user.
+
+{paint('add birthday', 'c')} {paint('<name> <date>', 'r')}: Add a birthday to an existing user.
+{paint('change birthday', 'c')} {paint('<name> <date>', 'r')}: Change the birthday of a user.
+{paint('show birthday', 'c')} {paint('<name>', 'r')}: Show the birthday of a user.
+{paint('when birthday', 'c')} {paint('<name>', 'r')}: Show the number of days until the next birthday of a user.
+{paint('remove birthday', 'c')} {paint('<name>', 'r')}: Deleting date of birth from an existing user.
+
+{paint('find', 'c')} {paint('[explain]', 'o')} {paint('<query>', 'r')}: Search for users by part of their name or phone number, or with clauses: {paint('name:ann', 'o')}, {paint('name:^ann', 'o')}, {paint('phone:^380', 'o')}, {paint('born:1990..1995', 'o')}, {paint('birthday<30d', 'o')}, {paint('limit:10', 'o')}, {paint('offset:20', 'o')}. {paint('explain', 'o')} shows how the query would run.
+{paint('dedupe', 'c')} {paint('[merge] [workers]', 'o')}: Find probable duplicate users and optionally merge them.
+{paint('stats memory', 'c')}: Show how much memory the address book uses.
+{paint('show all', 'c')} {paint('[from <name>]', 'o')}: Show all users in the address book in alphabetical order, optionally starting from a name.
+{paint('undo', 'c')} {paint('[n]', 'o')}: Undo the last command (or the last n commands) that changed the address book.
+{paint('redo', 'c')} {paint('[n]', 'o')}: Redo the last undone command (or n commands).
+{paint('hello', 'c')}: Display a welcome message.
+{paint('help', 'c')}: Show the list of available commands.
+{paint('save', 'c')} {paint('<format>', 'r')} {paint('[path]', 'o')}: Additionally save all contacts in one of the formats: \
+{paint('csv', 'o')}, {paint('jsonl', 'o')}, {paint('vcard', 'o')}, {paint('columnar', 'o')}. Paths ending with .gz are compressed.
+To exit the program, you can use one of the following commands: \
+{paint('exit', 'c')}, {paint('close', 'c')}, {paint('goodbye', 'c')}, {paint('quit', 'c')}, or {paint('q', 'c')}.
+
+Note:
+• Parameters enclosed in {paint('<angle brackets>', 'r')} and {paint('[square brackets]', 'o')} \
+are placeholders that should be replaced with the actual values.
+• Parameters enclosed in {paint('<angle brackets>', 'r')} are required and must be provided.
+• Parameters enclosed in {paint('[square brackets]', 'o')} are optional and can be omitted.
+• Name must not contain numbers.
+• Phone numbers and birthdates should be entered without spaces in between the digits, allowing separators: {paint('.,-/_', 'o')}.
+• The date should be in the format YYYY-MM-DD.
+    '''
+    return message
+
+
+def format_birthday(birthday: datetime) -> str:
+    """Formats a date of birth as 'DD.MM.YYYYр'."""
+
+    return birthday.strftime("%d.%m.%Yp")
+
+
+def format_table(items: list[tuple[str, Record]]) -> str:
+    """Formats a batch of records as a table.
+
+    Args:
+        items (list[tuple[str, Record]]): The names and records to show.
+
+    Returns:
+        str: The table.
+    """
+
+    representation_record = '-' * 70 + '\n'
+    representation_record += '|{:^33}|{:^20}|{:^13}|\n'.format("User", "Phones", "Birthday")
+    representation_record += '-' * 70 + '\n'
+    for name, user in items:
+        birthday = format_birthday(user.birthday.value) if user.birthday else ''
+        for i in range(len(user.phones)):
+            if i == 0:
+                representation_record += '| {:<32}|{:>19} |{:^13}|\n'.format(name, user.phones[i].value, birthday)
+            else:
+                representation_record += '|{:<33}|{:>19} |{:^13}|\n'.format(' ', user.phones[i].value, ' ')
+        if not user.phones:
+            representation_record += '| {:<32}|{:>19} |{:^13}|\n'.format(name, ' ', birthday)
+        representation_record += '-' * 70 + '\n'
+
+    return representation_record
+
+
+def format_pages(pages: list[list[tuple[str, Record]]]) -> str:
+    """Formats consecutive pages of records as tables separated by empty lines."""
+
+    return '\n'.join(map(format_table, pages))
+
+
+def render_tables(pages: Iterable[list[tuple[str, Record]]], workers: int = None) -> Iterator[str]:
+    """
+    Format pages of records as tables, PAGES_PER_CHUNK pages at a time.
+
+    The pages of an address book, i.e. the book itself or AddressBook.pages(), are split into ranges of its
+    name index that forked workers format from their own copy of the book, see parallel.map_ranges.
+    Other iterables of pages are formatted in this process.
+
+    Args:
+        pages (Iterable): The pages, e.g. an AddressBook or AddressBook.pages().
+        workers (int, optional): The number of processes formatting the tables. Defaults to parallel.WORKERS.
+
+    Yields:
+        str: The tables of consecutive chunks of pages, in order.
+    """
+
+    if isinstance(pages, AddressBook):
+        pages = pages.pages()
+
+    if isinstance(pages, Pages):
+        return parallel.map_ranges(partial(_format_range, pages.n), pages.book, *pages.bounds(),
+                                   PAGES_PER_CHUNK * pages.n, workers)
+
+    return map(format_pages, parallel.chunked(pages, PAGES_PER_CHUNK))
+
+
+def _format_range(n: int, book: AddressBook, start: int, stop: int) -> str:
+    """Formats the pages of n records between two positions of the name index. Runs in the worker processes."""
+
+    return format_pages(list(Pages(book, start, stop, n)))
+
+
+def format_size(size: int) -> str:
+    """Formats a number of bytes, e.g. 1536 as '1.5 KB'."""
+
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+    return f"{size:.1f} GB"
+
+
+def format_stats(stats: dict, indent: str = '', sizes: bool = False) -> str:
+    """Formats nested statistics as indented 'key: value' lines, with sizes in bytes made readable."""
+
+    lines = ''
+    for key, value in stats.items():
+        in_bytes = sizes or key in BYTE_KEYS
+        if isinstance(value, dict):
+            lines += f"{indent}{key}:\n" + format_stats(value, indent + '  ', in_bytes)
+        elif isinstance(value, list):
+            lines += f"{indent}{key}:\n" + ''.join(
+                f"{indent}  - " + ', '.join(f"{format_size(v) if k in BYTE_KEYS else v}" for k, v in item.items())
+                + '\n' for item in value)
+        else:
+            lines += f"{indent}{key}: {format_size(value) if in_bytes else value}\n"
+
+    return lines
+
+
+def render_terminal(result: Result | list[Result]) -> str | Iterator[str]:
+    """Renders a result for an interactive terminal.
+
+    Args:
+        result (Result | list[Result]): The result of a command.
+
+    Returns:
+        str | Iterator[str]: The colored text. Tables of users are yielded chunk by chunk as they are formatted,
+            so printing a large book starts at once and does not hold all of it in memory.
+    """
+
+    if isinstance(result, list):
+        return ''.join(joined(render_terminal(item)) + '\n' for item in result)
+
+    if result.kind == 'manual':
+        return manual()
+
+    if result.kind == 'stats':
+        return f"{color(result.message, 'h')}\n{format_stats(result.data)}"
+
+    if result.kind == 'commands':
+        return f"{color(result.message, 'r')} {', '.join(result.data)}."
+
+    if isinstance(result.data, (AddressBook, Pages, Iterator)):
+        return render_tables(result.data)
+
+    if isinstance(result.data, datetime):
+        return format_birthday(result.data)
+
+    if isinstance(result.data, list):
+        text = ''.join(f'{item}\n' for item in result.data)
+        return f"{result.message}\n{text}" if result.message else text
+
+    if result.subject is not None:
+        return f"{color(result.subject, 'c' if result.ok else 'r')} - {result.message}"
+
+    return result.message
+
+
+def joined(text: str | Iterator[str]) -> str:
+    """Returns the whole text rendered by render_terminal, joining the chunks of a streamed table."""
+
+    return text if isinstance(text, str) else '\n'.join(text)
+
+
+def _to_json(value):
+    """Converts the payload of a result to JSON-compatible values."""
+
+    if isinstance(value, (AddressBook, Pages, Iterator)):
+        return [record.to_dict() for page in value for _, record in page]
+
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def render_json(result: Result | list[Result]) -> str:
+    """Renders a result as a single line of JSON.
+
+    Args:
+        result (Result | list[Result]): The result of a command.
+
+    Returns:
+        str: The JSON document.
+    """
+
+    if isinstance(result, list):
+        return '[' + ', '.join(render_json(item) for item in result) + ']'
+
+    document = {'ok': result.ok, 'message': result.message}
+    if result.subject is not None:
+        document['subject'] = result.subject
+    if result.kind == 'manual':
+        document['message'] = manual(no_color)
+    if result.data is not None:
+        document['data'] = result.data
+
+    return json.dumps(document, default=_to_json, ensure_ascii=False)
+
+
+def render_silent(result: Result | list[Result]) -> str:
+    """Renders nothing. Used by scripts that only care about the side effects."""
+
+    return ''
+
+
+RENDERERS = {'terminal': render_terminal,
+             'json': render_json,
+             'silent': render_silent}
@@ -0,0 +1,458 @@
+from bisect import bisect_left, insort
+from collections.abc import Iterable, Iterator
+from datetime import date, timedelta
+from exceptions import InvalidQuery
+from itertools import islice
+import events
+import re
+
+TOKEN = re.compile(r'(?:[^\s"]+|"[^"]*")+')
+CLAUSE = re.compile(r'(name|phone|born|birthday|limit|offset)(<=|>=|:|<|>|=)(.*)', re.IGNORECASE)
+DAYS = re.compile(r'(\d+)d?', re.IGNORECASE)
+YEAR_DAYS = 365
+
+
+def digits(text: str) -> str:
+    return ''.join(filter(str.isdigit, text))
+
+
+def name_key(name: str) -> tuple[str, str]:
+    """Returns the key that orders names the way the name index of the address book does."""
+
+    return name.casefold(), name
+
+
+class BookIndex:
+    """
+    Secondary indexes of an address book, kept sorted with bisect and up to date through the event bus.
+
+    phones holds (digits of the phone, name), born holds (ordinal of the date of birth, name) and
+    calendar holds (month, day, name) of the birthdays. The entries are only candidates: every clause
+    is tested on the record itself, so an entry published by a record that is not in the book does no harm.
+    """
+
+    def __init__(self, book) -> None:
+        """
+        Build the indexes of an address book.
+
+        Args:
+            book (AddressBook): The address book.
+        """
+
+        self.book = book
+        self.phones = sorted((digits(phone.value), name) for name, record in book.data.items()
+                             for phone in record.phones)
+        born = [(record.birthday.value.date(), name) for name, record in book.data.items() if record.birthday]
+        self.born = sorted((day.toordinal(), name) for day, name in born)
+        self.calendar = sorted((day.month, day.day, name) for day, name in born)
+
+    @staticmethod
+    def _remove(entries: list, entry: tuple) -> None:
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _phone(self, phone: str, name: str, add: bool = True) -> None:
+        entry = (digits(phone), name)
+        insort(self.phones, entry) if add else self._remove(self.phones, entry)
+
+    def _birthday(self, birthday: str | None, name: str, add: bool = True) -> None:
+        if not birthday:
+            return
+        day = date.fromisoformat(birthday)
+        for entries, entry in ((self.born, (day.toordinal(), name)), (self.calendar, (day.month, day.day, name))):
+            insort(entries, entry) if add else self._remove(entries, entry)
+
+    def __call__(self, event: dict) -> None:
+        """Update the indexes with an event of the address book."""
+
+        name = event['name']
+        match event['type']:
+            case events.USER_ADDED | events.USER_REMOVED:
+                add = event['type'] == events.USER_ADDED
+                for phone in event['phones']:
+                    self._phone(phone, name, add)
+                self._birthday(event['birthday'], name, add)
+            case events.PHONE_ADDED:
+                self._phone(event['phone'], name)
+            case events.PHONE_REMOVED:
+                self._phone(event['phone'], name, add=False)
+            case events.PHONE_EDITED:
+                self._phone(event['old'], name, add=False)
+                self._phone(event['new'], name)
+            case events.BIRTHDAY_SET:
+                self._birthday(event['previous'], name, add=False)
+                self._birthday(event['birthday'], name)
+            case events.BIRTHDAY_REMOVED:
+                self._birthday(event['previous'], name, add=False)
+
+    def phone_range(self, prefix: str) -> tuple[int, int]:
+        """Returns the slice of self.phones with the phones that start with the digits."""
+
+        return bisect_left(self.phones, (prefix,)), bisect_left(self.phones, (prefix + chr(0x10FFFF),))
+
+    def born_range(self, low: date, high: date) -> tuple[int, int]:
+        """Returns the slice of self.born with the dates of birth from low to high inclusive."""
+
+        return bisect_left(self.born, (low.toordinal(),)), bisect_left(self.born, (high.toordinal() + 1,))
+
+    def calendar_ranges(self, today: date, low: int, high: int) -> list[tuple[int, int]]:
+        """
+        Find the slices of self.calendar with the birthdays celebrated in low to high days from today.
+
+        The window is one day longer than asked, so birthdays on February 29, celebrated on
+        February 28 in non-leap years, are not missed.
+        """
+
+        if high - low >= YEAR_DAYS - 1:
+            return [(0, len(self.calendar))]
+
+        start, end = today + timedelta(days=low), today + timedelta(days=high + 1)
+        i = bisect_left(self.calendar, (start.month, start.day))
+        j = bisect_left(self.calendar, (end.month, end.day + 1))
+        if start.year == end.year:
+            return [(i, j)]
+        return [(i, len(self.calendar)), (0, j)]
+
+
+_index = None
+
+
+def index_of(book) -> BookIndex:
+    """
+    Returns the indexes of the address book, building them on the first query.
+
+    The indexes of the last queried book are kept and updated by its events until another book is queried.
+    """
+
+    global _index
+    if _index is None or _index.book is not book:
+        if _index is not None:
+            events.bus.unsubscribe(_index)
+        _index = events.bus.subscribe(BookIndex(book))
+    return _index
+
+
+class Clause:
+    """
+    A condition of a query.
+
+    cost tells how expensive test() is, cheaper clauses are tested first. Indexed clauses
+    can also list their candidates from an index, and the planner starts from the one with the fewest.
+    """
+
+    cost = 1
+    indexed = False
+    ordered = False
+
+    def test(self, name: str, record) -> bool:
+        raise NotImplementedError
+
+    def estimate(self, index: BookIndex) -> int:
+        """Returns the number of candidates of the clause in the index."""
+
+        raise NotImplementedError
+
+    def candidates(self, index: BookIndex) -> Iterable[str]:
+        """Returns the names that may match, in name order if the clause is ordered."""
+
+        raise NotImplementedError
+
+
+class Text(Clause):
+    """Bare words: part of the name, or of the digits of a phone number."""
+
+    cost = 3
+
+    def __init__(self, text: str) -> None:
+        self.text = text.lower()
+        self.digits = digits(text)
+
+    def test(self, name: str, record) -> bool:
+        if self.text in name.lower():
+            return True
+        return bool(self.digits) and any(self.digits in digits(phone.value) for phone in record.phones)
+
+    def __str__(self) -> str:
+        return f"name or phone contains '{self.text}'"
+
+
+class NameContains(Clause):
+    """name:text"""
+
+    def __init__(self, text: str) -> None:
+        self.text = text.casefold()
+
+    def test(self, name: str, record) -> bool:
+        return self.text in name.casefold()
+
+    def __str__(self) -> str:
+        return f"name contains '{self.text}'"
+
+
+class NamePrefix(Clause):
+    """name:^text"""
+
+    indexed = True
+    ordered = True
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix.casefold()
+
+    def test(self, name: str, record) -> bool:
+        return name.casefold().startswith(self.prefix)
+
+    def estimate(self, index: BookIndex) -> int:
+        names = index.book._index
+        return bisect_left(names, (self.prefix + chr(0x10FFFF),)) - bisect_left(names, (self.prefix,))
+
+    def candidates(self, index: BookIndex) -> Iterable[str]:
+        return index.book.prefix(self.prefix)
+
+    def __str__(self) -> str:
+        return f"name starts with '{self.prefix}'"
+
+
+class PhoneContains(Clause):
+    """phone:digits"""
+
+    cost = 2
+
+    def __init__(self, text: str) -> None:
+        self.digits = digits(text)
+        if not self.digits:
+            raise InvalidQuery(f"no digits in the phone '{text}'")
+
+    def test(self, name: str, record) -> bool:
+        return any(self.digits in digits(phone.value) for phone in record.phones)
+
+    def __str__(self) -> str:
+        return f"phone contains {self.digits}"
+
+
+class PhonePrefix(PhoneContains):
+    """phone:^digits"""
+
+    indexed = True
+
+    def test(self, name: str, record) -> bool:
+        return any(digits(phone.value).startswith(self.digits) for phone in record.phones)
+
+    def estimate(self, index: BookIndex) -> int:
+        i, j = index.phone_range(self.digits)
+        return j - i
+
+    def candidates(self, index: BookIndex) -> Iterable[str]:
+        i, j = index.phone_range(self.digits)
+        return (name for _, name in index.phones[i:j])
+
+    def __str__(self) -> str:
+        return f"phone starts with {self.digits}"
+
+
+class Born(Clause):
+    """born:low..high, where the bounds are years or dates and either may be omitted."""
+
+    indexed = True
+
+    def __init__(self, low: date, high: date) -> None:
+        self.low = low
+        self.high = high
+
+    def test(self, name: str, record) -> bool:
+        return bool(record.birthday) and self.low <= record.birthday.value.date() <= self.high
+
+    def estimate(self, index: BookIndex) -> int:
+        i, j = index.born_range(self.low, self.high)
+        return j - i
+
+    def candidates(self, index: BookIndex) -> Iterable[str]:
+        i, j = index.born_range(self.low, self.high)
+        return (name for _, name in index.born[i:j])
+
+    def __str__(self) -> str:
+        return f"born from {self.low.isoformat()} to {self.high.isoformat()}"
+
+
+class BirthdayWithin(Clause):
+    """birthday<Nd, birthday<=Nd, birthday>Nd, birthday>=Nd, birthday=Nd: the days left until the birthday."""
+
+    indexed = True
+
+    def __init__(self, low: int, high: int, today: date) -> None:
+        self.low = low
+        self.high = high
+        self.today = today
+        self.ordinal = today.toordinal()
+
+    def test(self, name: str, record) -> bool:
+        days = record.days_to_birthday(self.ordinal)
+        return days is not None and self.low <= days <= self.high
+
+    def estimate(self, index: BookIndex) -> int:
+        return sum(j - i for i, j in index.calendar_ranges(self.today, self.low, self.high))
+
+    def candidates(self, index: BookIndex) -> Iterable[str]:
+        for i, j in index.calendar_ranges(self.today, self.low, self.high):
+            yield from (name for _, _, name in index.calendar[i:j])
+
+    def __str__(self) -> str:
+        return f"birthday in {self.low} to {self.high} days"
+
+
+def parse_bound(text: str, upper: bool) -> date:
+    """Parses a bound of born:, a year or a date in the format YYYY-MM-DD with any of the separators ,-/_."""
+
+    if re.fullmatch(r'\d{4}', text):
+        return date(int(text), 12, 31) if upper else date(int(text), 1, 1)
+    y, m, d = map(int, re.split(r'[.,\-/_]', text))
+    return date(y, m, d)
+
+
+def parse_born(op: str, value: str) -> Born:
+    """
+    Parses born:low..high, or born with a comparison, e.g. born<1990 (before 1990) or born>=1990-05-01.
+
+    A year compares as a whole: born<1990 ends on December 31, 1989 and born>1990 starts on January 1, 1991.
+    """
+
+    low, sep, high = value.partition('..')
+    try:
+        if sep and op not in (':', '='):
+            raise ValueError
+        if not sep:
+            low, high = parse_bound(value, False), parse_bound(value, True)
+            low, high = {'<': (date.min, low - timedelta(days=1)), '<=': (date.min, high),
+                         '>': (high + timedelta(days=1), date.max), '>=': (low, date.max)}.get(op, (low, high))
+            return Born(low, high)
+        return Born(parse_bound(low, False) if low else date.min, parse_bound(high, True) if high else date.max)
+    except (ValueError, OverflowError):
+        raise InvalidQuery(f"born{op}{value} is not a year or date range, e.g. born:1990..1995 or born<1990")
+
+
+def parse_birthday(op: str, value: str, today: date) -> BirthdayWithin:
+    if not (match := DAYS.fullmatch(value)):
+        raise InvalidQuery(f"birthday{op}{value} is not a number of days, e.g. birthday<30d")
+    days = int(match[1])
+    low, high = {'<': (0, days - 1), '<=': (0, days), '>': (days + 1, YEAR_DAYS), '>=': (days, YEAR_DAYS),
+                 '=': (days, days), ':': (days, days)}[op]
+    return BirthdayWithin(low, min(high, YEAR_DAYS), today)
+
+
+class Plan:
+    """How a query is run: the candidates to start from, the clauses to test, and the page to return."""
+
+    def __init__(self, book, clauses: list[Clause], offset: int, limit: int | None) -> None:
+        """
+        Choose the clause whose index gives the fewest candidates; without one, scan the book in name order.
+
+        Args:
+            book (AddressBook): The address book.
+            clauses (list[Clause]): The clauses, all of which must match.
+            offset (int): The number of matches to skip.
+            limit (int | None): The maximum number of matches.
+        """
+
+        self.book = book
+        self.offset = offset
+        self.limit = limit
+        self.index = index_of(book) if any(clause.indexed for clause in clauses) else None
+        self.estimates = {clause: clause.estimate(self.index) for clause in clauses if clause.indexed}
+        self.driver = min(self.estimates, key=self.estimates.get, default=None)
+        self.clauses = sorted(clauses, key=lambda clause: (clause is not self.driver, clause.cost))
+
+    def names(self) -> Iterator[str]:
+        """Yields the names of the matching users in alphabetical order."""
+
+        if self.driver is None:
+            candidates = self.book.names()
+        elif self.driver.ordered:
+            candidates = self.driver.candidates(self.index)
+        else:
+            candidates = sorted(set(self.driver.candidates(self.index)), key=name_key)
+
+        data = self.book.data
+        matches = (name for name in candidates
+                   if name in data and all(clause.test(name, data[name]) for clause in self.clauses))
+        stop = None if self.limit is None else self.offset + self.limit
+        return islice(matches, self.offset, stop)
+
+    def describe(self) -> list[str]:
+        """Returns the steps of the plan, one per line."""
+
+        if self.driver is None:
+            steps = [f"scan all {len(self.book.data)} users in name order"]
+        else:
+            kind = {NamePrefix: 'name', PhonePrefix: 'phone', Born: 'date of birth',
+                    BirthdayWithin: 'birthday calendar'}[type(self.driver)]
+            steps = [f"{kind} index: {self.driver} ({self.estimates[self.driver]} candidates)"]
+            if not self.driver.ordered:
+                steps.append("sort the candidates by name")
+        steps += [f"filter: {clause}" for clause in self.clauses if clause is not self.driver]
+        if self.offset or self.limit is not None:
+            steps.append(f"skip {self.offset}, return at most {'all' if self.limit is None else self.limit}")
+
+        return steps
+
+
+class Query:
+    """
+    A parsed find query. All clauses must match:
+        words            part of the name or of a phone number
+        name:ann         name contains ann, name:^ann starts with ann
+        phone:380        phone contains 380, phone:^380 starts with 380
+        born:1990..1995  date of birth in the years (or dates YYYY-MM-DD), either bound may be omitted
+        born<1990        born before 1990, also <=, > and >=
+        birthday<30d     birthday in less than 30 days, also <=, >, >= and =
+        limit:10 offset:20
+    Values with spaces are quoted: name:"mary ann".
+    """
+
+    def __init__(self, text: str, today: date) -> None:
+        """
+        Parse a query.
+
+        Args:
+            text (str): The query.
+            today (date): The date birthday clauses count from.
+
+        Raises:
+            InvalidQuery: If a clause cannot be parsed.
+        """
+
+        self.clauses = []
+        self.offset = 0
+        self.limit = None
+        words = []
+
+        for token in TOKEN.findall(text):
+            if not (match := CLAUSE.fullmatch(token)):
+                words.append(token.replace('"', ''))
+                continue
+
+            field, op, value = match[1].lower(), match[2], match[3].replace('"', '')
+            if field not in ('born', 'birthday') and op != ':':
+                raise InvalidQuery(f"use {field}:<value> instead of {token}")
+            if not value:
+                raise InvalidQuery(f"{token} has no value")
+
+            if field == 'name':
+                self.clauses.append(NamePrefix(value[1:]) if value.startswith('^') else NameContains(value))
+            elif field == 'phone':
+                self.clauses.append(PhonePrefix(value[1:]) if value.startswith('^') else PhoneContains(value))
+            elif field == 'born':
+                self.clauses.append(parse_born(op, value))
+            elif field == 'birthday':
+                self.clauses.append(parse_birthday(op, value, today))
+            elif not value.isdigit():
+                raise InvalidQuery(f"{field} must be a number")
+            else:
+                setattr(self, field, int(value))
+
+        if words:
+            self.clauses.append(Text(' '.join(words)))
+
+    def plan(self, book) -> Plan:
+        """Choose how to run the query on the address book."""
+
+        return Plan(book, self.clauses, self.offset, self.limit)
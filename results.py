@@ -0,0 +1,36 @@
+class Result:
+    """Outcome of a command, kept free of any formatting."""
+
+    def __init__(self, message: str = '', subject: str = None, ok: bool = True, data=None, kind: str = None) -> None:
+        """
+        Initialize a result.
+
+        Args:
+            message (str, optional): What happened. Defaults to ''.
+            subject (str, optional): The user input the message is about, e.g. a phone number. Defaults to None.
+            ok (bool, optional): Whether the command succeeded. Defaults to True.
+            data (optional): Any payload produced by the command, e.g. a list of phones or an AddressBook.
+            kind (str, optional): A hint for front-ends that render some results specially. Defaults to None.
+        """
+
+        self.message = message
+        self.subject = subject
+        self.ok = ok
+        self.data = data
+        self.kind = kind
+
+    @classmethod
+    def failure(cls, error: Exception | str, subject: str = None, data=None) -> 'Result':
+        """
+        Build a failed result from an exception or a message.
+
+        Args:
+            error (Exception | str): The reason of the failure.
+            subject (str, optional): The user input that caused the failure. Defaults to None.
+            data (optional): Details of the failure. Defaults to None.
+        """
+
+        return cls(str(error), subject, ok=False, data=data)
+
+    def __repr__(self) -> str:
+        return f"Result({self.message!r}, subject={self.subject!r}, ok={self.ok!r})"
@@ -0,0 +1,197 @@
+from address_book import AddressBook
+from collections.abc import Callable
+from locking import locked, replaced
+import events
+import os
+import pickle
+import struct
+
+MAGIC = b'ABBOOK1\n'
+HEADER = struct.Struct('<Q')
+
+
+def read_version(path: str) -> int:
+    """
+    Read the version of the address book file without loading it.
+
+    Returns:
+        int: The version, 0 if the file does not exist or was written before versions were introduced.
+    """
+
+    try:
+        with open(path, 'rb') as fh:
+            header = fh.read(len(MAGIC) + HEADER.size)
+    except FileNotFoundError:
+        return 0
+
+    if not header.startswith(MAGIC):
+        return 0
+    return HEADER.unpack(header[len(MAGIC):])[0]
+
+
+def read(path: str) -> tuple[int, AddressBook]:
+    """
+    Load an address book file.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        tuple[int, AddressBook]: The version of the file and the address book.
+    """
+
+    with open(path, 'rb') as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            fh.seek(0)
+            return 0, pickle.load(fh)
+        version, = HEADER.unpack(fh.read(HEADER.size))
+        return version, pickle.load(fh)
+
+
+def write(path: str, book: AddressBook, version: int) -> None:
+    """
+    Save an address book atomically: it is written to a temporary file which then replaces the old one.
+
+    Args:
+        path (str): The path to the file.
+        book (AddressBook): The address book.
+        version (int): The version to store in the header.
+    """
+
+    with replaced(path) as fh:
+        fh.write(MAGIC + HEADER.pack(version))
+        pickle.dump(book, fh)
+
+
+class Storage:
+    """
+    Keeps an address book in sync with its file when several processes use the same file.
+
+    The changes made since the last load or save are collected from the event bus. When the file
+    turns out to be newer than the loaded version, the newer book is loaded and the pending changes
+    are replayed on it instead of overwriting what the other process saved. A change that no longer
+    applies is dropped and reported in conflicts.
+
+    Consumers that must only see what reached the file, e.g. a log of the changes, subscribe to the
+    storage rather than to the event bus: the changes are delivered to them once they are saved.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the storage and start collecting the changes of the address book.
+
+        Args:
+            path (str): The path to the address book file.
+        """
+
+        self.path = path
+        self.version = 0
+        self.pending = []
+        self.conflicts = []
+        self._subscribers = []
+        events.bus.subscribe(self.pending.append)
+
+    def subscribe(self, callback: Callable[[dict], None]) -> Callable[[dict], None]:
+        """
+        Start delivering the saved changes to the callback, in the order they were made.
+
+        Args:
+            callback (Callable): Called with every event once it is saved to the file.
+
+        Returns:
+            Callable: The callback.
+        """
+
+        self._subscribers.append(callback)
+        return callback
+
+    def load(self) -> AddressBook:
+        """Load the address book, or create an empty one if the file does not exist."""
+
+        if os.path.exists(self.path):
+            self.version, book = read(self.path)
+        else:
+            self.version, book = 0, AddressBook()
+        self.pending.clear()
+
+        return book
+
+    def _merge(self) -> tuple[int, AddressBook]:
+        """
+        Load the newer address book from the file and replay the pending changes on it.
+
+        A change stops at its first operation that fails; it is then removed from the pending changes
+        and added to conflicts, and so are the later changes of the same user, which built on it
+        (e.g. a phone added to a user whose name another process took meanwhile).
+        A file that was deleted counts as an empty book at version 0.
+        """
+
+        try:
+            version, book = read(self.path)
+        except FileNotFoundError:
+            version, book = 0, AddressBook()
+
+        replayed, failed = [], {}
+        with events.bus.paused():
+            for event in self.pending:
+                if event['name'] in failed:
+                    self.conflicts.append((event, failed[event['name']]))
+                    continue
+                for op in events.to_operations(event):
+                    result, = book.apply_batch([op])
+                    if not result.ok:
+                        self.conflicts.append((event, result.error))
+                        failed[event['name']] = result.error
+                        break
+                else:
+                    replayed.append(event)
+        self.pending[:] = replayed
+
+        return version, book
+
+    def refresh(self, book: AddressBook) -> AddressBook:
+        """
+        Pick up the changes saved by other processes. Costs one small read when there are none.
+
+        Args:
+            book (AddressBook): The address book in memory.
+
+        Returns:
+            AddressBook: The same book, or the newer one with the pending changes replayed.
+        """
+
+        if read_version(self.path) == self.version:
+            return book
+
+        self.version, book = self._merge()
+        return book
+
+    def save(self, book: AddressBook) -> AddressBook:
+        """
+        Save the pending changes of the address book and deliver them to the subscribers.
+
+        Args:
+            book (AddressBook): The address book in memory.
+
+        Returns:
+            AddressBook: The book that was saved. It differs from the given one when another process
+                saved in the meantime and the pending changes were replayed on its version.
+        """
+
+        if not self.pending and os.path.exists(self.path):
+            return book
+
+        with locked(self.path):
+            version = read_version(self.path)
+            if version != self.version:
+                version, book = self._merge()
+            write(self.path, book, version + 1)
+
+        self.version = version + 1
+        saved = list(self.pending)
+        self.pending.clear()
+        for callback in self._subscribers:
+            for event in saved:
+                callback(event)
+
+        return book
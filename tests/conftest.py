@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import events
+import pytest
+import query
+
+
+@pytest.fixture(autouse=True)
+def bus():
+    """Drop the subscribers a test added to the event bus, e.g. a Storage, a History or the query indexes."""
+
+    subscribers = list(events.bus._subscribers)
+    yield events.bus
+    events.bus._subscribers[:] = subscribers
+    query._index = None
@@ -0,0 +1,88 @@
+from address_book import AddressBook, Birthday, FixedClock, Name, Record
+from datetime import date, datetime
+import address_book
+import pickle
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FixedClock(date(2025, 3, 1))
+    monkeypatch.setattr(Record, 'clock', clock)
+    return clock
+
+
+def record(day: datetime) -> Record:
+    return Record(Name('Ann'), birthday=Birthday(day))
+
+
+def test_birthday_today_is_zero_days_away(clock):
+    assert record(datetime(1990, 3, 1)).days_to_birthday() == 0
+
+
+def test_birthday_rolls_over_to_next_year(clock):
+    rec = record(datetime(1990, 3, 1))
+    assert rec.days_to_birthday() == 0
+
+    clock.day = date(2025, 3, 2)
+    assert rec.days_to_birthday() == 364
+
+
+def test_cached_birthday_is_not_recomputed(clock, monkeypatch):
+    rec = record(datetime(1990, 3, 10))
+    assert rec.days_to_birthday() == 9
+
+    calls = []
+    original = address_book.next_birthday
+    monkeypatch.setattr(address_book, 'next_birthday', lambda *args: calls.append(args) or original(*args))
+    clock.day = date(2025, 3, 5)
+    assert rec.days_to_birthday() == 5
+    assert calls == []
+
+    clock.day = date(2025, 3, 11)
+    assert rec.days_to_birthday() == 364
+    assert len(calls) == 1
+
+
+def test_changing_the_birthday_drops_the_cache(clock):
+    rec = record(datetime(1990, 3, 10))
+    assert rec.days_to_birthday() == 9
+
+    rec.birthday = Birthday(datetime(1990, 3, 20))
+    assert rec.days_to_birthday() == 19
+
+
+@pytest.mark.parametrize('today, days', [(date(2024, 2, 1), 28),   # leap year: February 29
+                                         (date(2025, 2, 1), 27),   # non-leap year: February 28
+                                         (date(2025, 2, 28), 0),
+                                         (date(2025, 3, 1), 364)])  # next one is 2026-02-28
+def test_february_29(clock, today, days):
+    clock.day = today
+    assert record(datetime(1996, 2, 29)).days_to_birthday() == days
+
+
+class Pickled:
+    """Pickles as an instance of cls with the given state, the way objects with a __dict__ were pickled."""
+
+    def __init__(self, cls: type, state: dict) -> None:
+        self.cls = cls
+        self.state = state
+
+    def __reduce_ex__(self, protocol):
+        return self.cls.__new__, (self.cls,), self.state
+
+
+def test_baseline_pickle_loads(clock):
+    # Before the cache the record kept the birthday in 'birthday' and the book had no name index.
+    old = Pickled(Record, {'name': Pickled(Name, {'_Field__value': 'Ann'}), 'phones': [],
+                           'birthday': Pickled(Birthday, {'_Field__value': datetime(1990, 3, 5)})})
+    book = AddressBook.__new__(AddressBook)
+    book.__dict__['data'] = {'Ann': old}
+
+    loaded = pickle.loads(pickle.dumps(book))
+
+    rec = loaded['Ann']
+    assert rec.birthday.value == datetime(1990, 3, 5)
+    assert not hasattr(rec, '__dict__')
+    assert rec.days_to_birthday() == 4
+    assert loaded.prefix('a') == ['Ann']
@@ -0,0 +1,84 @@
+from address_book import AddressBook
+from datetime import datetime
+import dedupe
+import pytest
+
+
+@pytest.mark.parametrize('word, code', [('Robert', 'R163'), ('Rupert', 'R163'), ('Ashcraft', 'A261'),
+                                        ('Pfister', 'P236'), ('Lee', 'L000'), ('Олена', 'O450'),
+                                        ('Оксана', 'O250'), ("Мар'яна", 'M650'), ('李', ''), ('', '')])
+def test_soundex(word, code):
+    assert dedupe.soundex(word) == code
+
+
+def test_cyrillic_names_do_not_collapse_to_initials():
+    assert dedupe.name_keys('Олена Петренко')[1] != dedupe.name_keys('Оксана Павленко')[1]
+    assert dedupe.name_keys('Олена Петренко')[1] == dedupe.name_keys('Olena Petrenko')[1]
+
+
+def test_names_without_codes_have_only_the_token_key():
+    assert dedupe.name_keys('李 明') == ['tokens:明 李']
+    assert dedupe.name_keys('Ann 李') == ['tokens:ann 李', 'soundex:A500']
+
+
+@pytest.fixture
+def book():
+    book = AddressBook()
+    book.apply_batch([
+        ('add user', 'John Smith'), ('add phone', 'John Smith', '+380501234567'),
+        ('add user', 'Smith John'), ('add phone', 'Smith John', '0671111111'),
+        ('add birthday', 'Smith John', datetime(1990, 3, 5)),
+        ('add user', 'Jon Smith'), ('add phone', 'Jon Smith', '050-123-45-67'), ('add phone', 'Jon Smith', '0672222222'),
+        ('add user', 'Home'), ('add phone', 'Home', '0501234567'),
+        ('add user', 'Олена Петренко'), ('add user', 'Олена Петренко-Ш'), ('add user', 'Оксана Павленко'),
+        ('add user', 'Zoe'),
+    ])
+    return book
+
+
+def names(blocks) -> list[list[str]]:
+    return sorted(sorted(name for name, _ in block) for block in blocks)
+
+
+def test_blocks_share_a_phone_in_any_format_or_a_name_key(book):
+    blocks = names(dedupe.build_blocks(book))
+
+    assert ['Home', 'John Smith', 'Jon Smith'] in blocks
+    assert ['John Smith', 'Smith John'] in blocks
+    assert not any('Оксана Павленко' in block for block in blocks)
+    assert not any('Zoe' in block for block in blocks)
+
+
+def test_large_blocks_are_dropped(book):
+    assert ['Home', 'John Smith', 'Jon Smith'] not in names(dedupe.build_blocks(book, max_block=2))
+
+
+def suggestions(book, workers=1) -> list[tuple]:
+    return [(s.keep, s.duplicate, s.reasons) for s in dedupe.find_duplicates(book, workers)]
+
+
+def test_find_duplicates(book):
+    found = suggestions(book)
+
+    assert found[0] == ('Jon Smith', 'John Smith', ['name', 'phone'])
+    assert ('Jon Smith', 'Home', ['phone']) in found
+    assert ('Smith John', 'John Smith', ['name']) in found or ('John Smith', 'Smith John', ['name']) in found
+    assert ('Олена Петренко', 'Олена Петренко-Ш', ['name']) in found
+    assert not any('Оксана Павленко' in pair[:2] for pair in found)
+
+
+def test_parallel_search_finds_the_same(book):
+    assert suggestions(book, workers=2) == suggestions(book)
+
+
+def test_merge_moves_new_phones_and_the_birthday(book):
+    merge = [s for s in dedupe.find_duplicates(book) if 'name' in s.reasons and 'Smith' in s.keep]
+    merged = dedupe.merge_duplicates(book, merge)
+
+    assert len(merged) == 2
+    remaining = [name for name in ('John Smith', 'Smith John', 'Jon Smith') if name in book]
+    assert remaining == ['Jon Smith']
+    record = book['Jon Smith']
+    assert [phone.value for phone in record.phones] == ['050-123-45-67', '0672222222', '0671111111']
+    assert record.birthday.value == datetime(1990, 3, 5)
+    assert 'Home' in book
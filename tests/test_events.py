@@ -0,0 +1,104 @@
+from address_book import AddressBook
+from datetime import datetime
+import events
+import json
+import pytest
+
+
+@pytest.fixture
+def published(bus):
+    published = []
+    bus.subscribe(published.append)
+    return published
+
+
+def test_bus_delivers_in_order_until_unsubscribed(bus):
+    received = []
+    bus.subscribe(received.append)
+    bus.publish(events.PHONE_ADDED, name='Ann', phone='0501234567')
+    with bus.paused():
+        bus.publish(events.PHONE_REMOVED, name='Ann', phone='0501234567')
+    bus.unsubscribe(received.append)
+    bus.publish(events.USER_REMOVED, name='Ann', phones=[], birthday=None)
+
+    assert received == [{'type': events.PHONE_ADDED, 'name': 'Ann', 'phone': '0501234567'}]
+
+
+def test_every_mutation_publishes_its_event(published):
+    book = AddressBook()
+    book.apply_batch([('add user', 'Ann'), ('add phone', 'Ann', '0501234567'),
+                      ('change phone', 'Ann', '0501234567', '0507654321'),
+                      ('add birthday', 'Ann', datetime(1990, 3, 5)), ('add birthday', 'Ann', datetime(1991, 4, 6)),
+                      ('remove birthday', 'Ann'), ('remove phone', 'Ann', '0507654321'), ('remove user', 'Ann')])
+
+    assert published == [
+        {'type': 'user_added', 'name': 'Ann', 'phones': [], 'birthday': None},
+        {'type': 'phone_added', 'name': 'Ann', 'phone': '0501234567'},
+        {'type': 'phone_edited', 'name': 'Ann', 'old': '0501234567', 'new': '0507654321'},
+        {'type': 'birthday_set', 'name': 'Ann', 'birthday': '1990-03-05', 'previous': None},
+        {'type': 'birthday_set', 'name': 'Ann', 'birthday': '1991-04-06', 'previous': '1990-03-05'},
+        {'type': 'birthday_removed', 'name': 'Ann', 'previous': '1991-04-06'},
+        {'type': 'phone_removed', 'name': 'Ann', 'phone': '0507654321'},
+        {'type': 'user_removed', 'name': 'Ann', 'phones': [], 'birthday': None},
+    ]
+
+
+def snapshot(book: AddressBook) -> list[dict]:
+    return [record.to_dict() for record in book.records()]
+
+
+OPS = [('add user', 'Ann'), ('add phone', 'Ann', '0501234567'), ('add user', 'Bob'),
+       ('add birthday', 'Bob', datetime(1990, 3, 5)), ('change phone', 'Ann', '0501234567', '0507654321'),
+       ('add birthday', 'Bob', datetime(1991, 4, 6)), ('add phone', 'Bob', '0670000000'),
+       ('remove phone', 'Bob', '0670000000'), ('add user', 'Cy'), ('add birthday', 'Cy', datetime(1980, 1, 1)),
+       ('remove birthday', 'Cy'), ('remove user', 'Cy')]
+
+
+def test_operations_of_the_events_repeat_the_changes(published):
+    book = AddressBook()
+    book.apply_batch(OPS)
+    changes = list(published)
+
+    mirror = AddressBook()
+    results = mirror.apply_batch(op for event in changes for op in events.to_operations(event))
+
+    assert all(result.ok for result in results)
+    assert snapshot(mirror) == snapshot(book)
+
+
+def test_inverse_events_revert_the_changes(published):
+    book = AddressBook()
+    book.apply_batch(OPS[:3])
+    before = snapshot(book)
+    published.clear()
+    book.apply_batch(OPS[3:])
+
+    reverted = [events.inverse(event) for event in reversed(published)]
+    results = book.apply_batch(op for event in reverted for op in events.to_operations(event))
+
+    assert all(result.ok for result in results)
+    assert snapshot(book) == before
+
+
+def test_read_events_resumes_from_any_offset(tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    sink = events.JsonlSink(path)
+    for i in range(50):
+        sink({'type': events.PHONE_ADDED, 'name': f'User {i}' * (i % 7 + 1), 'phone': '0501234567'})
+    sink.close()
+
+    for offset in range(52):
+        assert [event['seq'] for event in events.read_events(path, offset)] == list(range(offset + 1, 51))
+
+
+def test_read_events_ignores_a_partial_last_line(tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    sink = events.JsonlSink(path)
+    for i in range(5):
+        sink({'type': events.PHONE_ADDED, 'name': 'Ann', 'phone': f'050123456{i}'})
+    sink.close()
+    with open(path, 'a', encoding='utf-8') as fh:
+        fh.write('{"seq": 6, "ty')
+
+    assert [event['seq'] for event in events.read_events(path, 3)] == [4, 5]
+    assert json.loads(open(path, encoding='utf-8').readline())['seq'] == 1
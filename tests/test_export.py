@@ -0,0 +1,67 @@
+from address_book import AddressBook
+from datetime import datetime
+import export
+import main
+import pytest
+import struct
+
+
+@pytest.fixture
+def book():
+    book = AddressBook()
+    book.apply_batch([('add user', 'Ann'), ('add phone', 'Ann', '0501234567'),
+                      ('add birthday', 'Ann', datetime(1990, 3, 5)), ('add user', 'Bob')])
+    return book
+
+
+@pytest.mark.parametrize('name', ['users.columnar', 'users.columnar.gz'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_columnar_round_trip(book, tmp_path, name, compress):
+    path = str(tmp_path / name)
+    assert export.export(book.records(), path, 'columnar', compress=compress) == 2
+
+    assert list(export.read_columnar(path)) == [
+        {'name': 'Ann', 'phones': ['0501234567'], 'birthday': '1990-03-05'},
+        {'name': 'Bob', 'phones': [], 'birthday': None}]
+
+
+def test_save_to_missing_directory_fails_cleanly(book, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'ab', book)
+
+    result = main.save_in_format(['csv', str(tmp_path / 'missing' / 'users.csv')])
+
+    assert not result.ok
+    assert 'could not be saved' in result.message
+
+
+def test_long_vcard_lines_are_folded(tmp_path):
+    name = 'Олександра-Вікторія ' * 6 + 'Longname'
+    book = AddressBook()
+    book.apply_batch([('add user', name), ('add phone', name, '0501234567')])
+    path = str(tmp_path / 'users.vcf')
+    export.export(book.records(), path, 'vcard')
+
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    lines = data.split(b'\r\n')
+    assert max(len(line) for line in lines) <= 75
+    assert any(line.startswith(b' ') for line in lines)
+
+    unfolded = data.replace(b'\r\n ', b'').decode('utf-8')
+    assert f'FN:{name}\r\n' in unfolded
+    assert 'TEL;VALUE=uri;TYPE=cell:tel:0501234567\r\n' in unfolded
+
+
+def test_columnar_integers_have_standard_sizes(book, tmp_path):
+    path = str(tmp_path / 'users.abcol')
+    export.export(book.records(), path, 'columnar')
+
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    group = data[len(export.COLUMNAR_MAGIC):]
+    assert group[:2] == export.ROW_GROUP_MARK
+    assert struct.unpack('<I', group[2:6]) == (2,)
+    names_size, = struct.unpack('<Q', group[6:14])
+    assert group[14:22] == struct.pack('<2I', 3, 3)
+    assert group[22:14 + names_size] == b'AnnBob'
+    assert data.endswith(struct.pack('<I', 1) + export.COLUMNAR_MAGIC)
@@ -0,0 +1,130 @@
+from address_book import AddressBook
+from history import History
+import events
+import history
+import json
+import os
+import pytest
+
+
+@pytest.fixture
+def book():
+    return AddressBook()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'users.history')
+
+
+def restart(history: History) -> History:
+    """Forget the history in memory and load it from its log, as a new process would."""
+
+    events.bus.unsubscribe(history)
+    return History(history.path)
+
+
+def run(book: AddressBook, history: History, command: str, *ops: tuple) -> None:
+    assert all(result.ok for result in book.apply_batch(ops))
+    history.commit(command)
+
+
+def test_undo_and_redo_survive_a_restart(book, path):
+    log = History(path)
+    run(book, log, 'add user Ann', ('add user', 'Ann'), ('add phone', 'Ann', '0501234567'))
+    run(book, log, 'change phone Ann', ('change phone', 'Ann', '0501234567', '0507654321'))
+    run(book, log, 'remove user Ann', ('remove user', 'Ann'))
+
+    log = restart(log)
+    assert [command for command, _ in log.undo(book)] == ['remove user Ann']
+    assert [phone.value for phone in book['Ann'].phones] == ['0507654321']
+
+    log = restart(log)
+    assert [command for command, _ in log.undo(book, 5)] == ['change phone Ann', 'add user Ann']
+    assert 'Ann' not in book
+
+    log = restart(log)
+    assert [command for command, _ in log.redo(book, 2)] == ['add user Ann', 'change phone Ann']
+    assert [phone.value for phone in book['Ann'].phones] == ['0507654321']
+    assert [group['command'] for group in restart(log).undone] == ['remove user Ann']
+
+
+def test_a_new_command_clears_redo(book, path):
+    log = History(path)
+    run(book, log, 'add user Ann', ('add user', 'Ann'))
+    log.undo(book)
+    run(book, log, 'add user Bob', ('add user', 'Bob'))
+
+    assert log.redo(book) == []
+    assert restart(log).undone == []
+
+
+def test_partial_last_line_is_dropped(book, path):
+    log = History(path)
+    run(book, log, 'add user Ann', ('add user', 'Ann'))
+    with open(path, 'a', encoding='utf-8') as fh:
+        fh.write('{"do": {"id": "x", "comm')
+
+    log = restart(log)
+    assert [group['command'] for group in log.done] == ['add user Ann']
+
+    run(book, log, 'add user Bob', ('add user', 'Bob'))
+    with open(path, encoding='utf-8') as fh:
+        lines = [json.loads(line) for line in fh]
+    assert [line['do']['command'] for line in lines] == ['add user Ann', 'add user Bob']
+    assert [group['command'] for group in restart(log).done] == ['add user Ann', 'add user Bob']
+
+
+def test_checkpoint_keeps_the_stacks(book, path, monkeypatch):
+    monkeypatch.setattr(history, 'HISTORY', 10)
+    monkeypatch.setattr(history, 'CHECKPOINT', 5)
+    log = History(path)
+    for i in range(30):
+        run(book, log, f'add user U{i}', ('add user', f'U{i}'))
+    log.undo(book, 3)
+
+    with open(path, encoding='utf-8') as fh:
+        assert len(fh.readlines()) <= 10 + 5
+
+    log = restart(log)
+    assert [group['command'] for group in log.done] == [f'add user U{i}' for i in range(20, 27)]
+    assert [group['command'] for group in log.undone] == ['add user U29', 'add user U28', 'add user U27']
+
+
+def test_undo_does_not_record_itself(book, path):
+    log = History(path)
+    run(book, log, 'add user Ann', ('add user', 'Ann'))
+    log.undo(book)
+    log.commit('undo')
+
+    assert log.current == []
+    assert len(log.undone) == 1
+
+
+def test_discarded_events_are_not_undone(book, path):
+    log = History(path)
+    book.apply_batch([('add user', 'Ann'), ('add user', 'Bob')])
+    log.discard([event for event in log.current if event['name'] == 'Bob'])
+    log.commit('add users')
+
+    log.undo(book)
+
+    assert list(book.data) == ['Bob']
+    assert [event['name'] for event in restart(log).undone[0]['events']] == ['Ann']
+
+
+def test_long_partial_line_is_cut_at_its_start(book, path, monkeypatch):
+    monkeypatch.setattr(history, 'BLOCK', 8)
+    log = History(path)
+    run(book, log, 'add user Ann', ('add user', 'Ann'))
+    size = os.path.getsize(path)
+    with open(path, 'a', encoding='utf-8') as fh:
+        fh.write('{"do": {"id": "x", "command": "' + 'x' * 100)
+
+    run(book, log, 'add user Bob', ('add user', 'Bob'))
+    with open(path, 'rb') as fh:
+        assert fh.read(size).endswith(b'\n')
+        assert json.loads(fh.read())['do']['command'] == 'add user Bob'
+
+    run(book, log, 'add user Cid', ('add user', 'Cid'))
+    assert [group['command'] for group in restart(log).done] == ['add user Ann', 'add user Bob', 'add user Cid']
@@ -0,0 +1,72 @@
+from address_book import AddressBook, Birthday, Name, Phone, Record
+from datetime import datetime
+from memory import MemoryTracker
+import memory
+import pickle
+import pytest
+import tracemalloc
+
+
+@pytest.fixture
+def book():
+    book = AddressBook()
+    for i in range(3000):
+        book.add_record(Record(Name(f'User{i:05d}'), Phone(f'050{i:07d}'), Birthday(datetime(1990, 1 + i % 12, 1))))
+    # Unpickled, as after loading users.bin: the strings are not interned yet.
+    return pickle.loads(pickle.dumps(book))
+
+
+def test_book_memory_estimates_from_a_sample(book):
+    report = memory.book_memory(book, sample=100)
+
+    assert (report['records'], report['phones'], report['birthdays']) == (3000, 3000, 3000)
+    assert report['measured records'] == 100
+    assert report['total'] == sum(report['sizes'].values())
+    assert report['total'] == pytest.approx(memory.deep_sizeof(book), rel=0.05)
+    assert report['pickle'] == pytest.approx(len(pickle.dumps(book)), rel=0.05)
+
+
+def test_book_memory_of_an_empty_book():
+    report = memory.book_memory(AddressBook())
+
+    assert (report['records'], report['measured records'], report['phones per record']) == (0, 0, 0)
+
+
+def test_deep_sizeof_follows_slots():
+    record = Record(Name('Ann'), Phone('0501234567'))
+
+    assert memory.deep_sizeof(record) > memory.deep_sizeof(record.phones) + memory.deep_sizeof(record.name)
+
+
+def test_compact_keeps_the_content(book):
+    before = [record.to_dict() for record in book.records()]
+    book['User00007'].phones.append(Phone('0671234567'))
+    before[7]['phones'].append('0671234567')
+
+    freed = memory.compact(book)
+
+    assert freed > 0
+    assert [record.to_dict() for record in book.records()] == before
+    assert book.prefix('user0000') == [f'User{i:05d}' for i in range(10)]
+    name, record = next(iter(book.data.items()))
+    assert name is record.name.value is book._index[0][1]
+
+
+def test_tracker_measures_the_block():
+    tracker = MemoryTracker()
+    with tracker.track('untraced'):
+        pass
+    assert tracker.snapshots == {}
+
+    tracemalloc.start()
+    try:
+        with tracker.track('allocate'):
+            kept = [bytes(1000) for _ in range(1000)]
+    finally:
+        tracemalloc.stop()
+
+    stats = tracker.snapshots['allocate']
+    assert stats['allocated'] >= 1000 * 1000
+    assert stats['peak'] >= stats['allocated']
+    assert 'test_memory.py:' in stats['top'][0]['line']
+    assert len(kept) == 1000
@@ -0,0 +1,68 @@
+from address_book import AddressBook
+import main
+import pytest
+
+NAMES = ['adam', 'Anna', 'ann', 'Bob', 'bobby', 'Carl', 'Ümit', 'zoe']
+
+
+@pytest.fixture
+def book():
+    book = AddressBook()
+    book.apply_batch([('add user', name) for name in NAMES])
+    return book
+
+
+def test_names_are_in_case_insensitive_order(book):
+    assert list(book.names()) == ['adam', 'ann', 'Anna', 'Bob', 'bobby', 'Carl', 'zoe', 'Ümit']
+
+
+def test_names_from_a_cursor_with_offset_and_limit(book):
+    assert list(book.names('B')) == ['Bob', 'bobby', 'Carl', 'zoe', 'Ümit']
+    assert list(book.names('bob', offset=1, limit=2)) == ['bobby', 'Carl']
+    assert list(book.names('zz', limit=5)) == ['Ümit']
+    assert list(book.names('ü', offset=1)) == []
+    assert list(book.names(limit=0)) == []
+
+
+def test_prefix_ignores_case(book):
+    assert book.prefix('AN') == ['ann', 'Anna']
+    assert book.prefix('bob') == ['Bob', 'bobby']
+    assert book.prefix('x') == []
+    assert book.prefix('') == list(book.names())
+
+
+def test_name_range_includes_low_and_excludes_high(book):
+    assert book.name_range('ANN', 'bobby') == ['ann', 'Anna', 'Bob']
+    assert book.name_range('b', 'C') == ['Bob', 'bobby']
+    assert book.name_range('c', 'b') == []
+
+
+def test_pages_keep_the_order_across_page_boundaries(book):
+    pages = list(book.pages(n=3))
+    assert [[name for name, _ in page] for page in pages] == [['adam', 'ann', 'Anna'], ['Bob', 'bobby', 'Carl'],
+                                                              ['zoe', 'Ümit']]
+    assert [name for page in book.pages('anna', offset=1, n=2) for name, _ in page] == ['Bob', 'bobby', 'Carl',
+                                                                                     'zoe', 'Ümit']
+
+
+def test_index_follows_removals(book):
+    del book['Anna']
+    book.apply_batch([('remove user', 'zoe'), ('add user', 'Anya')])
+
+    assert book.prefix('an') == ['ann', 'Anya']
+    assert list(book.names('y')) == ['Ümit']
+
+
+def test_show_all_from(book, monkeypatch):
+    monkeypatch.setattr(main, 'ab', book)
+
+    result = main.show_all(['from', 'Carl'])
+    assert [name for page in result.data for name, _ in page] == ['Carl', 'zoe', 'Ümit']
+
+    assert main.show_all(['from', 'ü']).ok
+    past = main.show_all(['from', 'üz'])
+    assert past.data is None
+    assert past.message == 'There are no users after üz'
+
+    assert not main.show_all(['from']).ok
+    assert not main.show_all(['since', 'a']).ok
@@ -0,0 +1,61 @@
+from address_book import AddressBook
+from presentation import render_tables
+import export
+import multiprocessing
+import os
+import parallel
+import pytest
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield
+    parallel.shutdown()
+
+
+@pytest.fixture
+def book():
+    book = AddressBook()
+    book.apply_batch(op for i in range(250) for op in [('add user', f'User{i:03d}'), ('add phone', f'User{i:03d}', f'050{i:07d}')])
+    return book
+
+
+def _pid_and_names(book, start, stop):
+    return os.getpid(), [record.name.value for record in book.records(start, stop)]
+
+
+def test_ranges_are_read_from_the_inherited_book(book):
+    results = list(parallel.map_ranges(_pid_and_names, book, 5, 250, 100, workers=2))
+
+    assert [names for _, names in results] == [[f'User{i:03d}' for i in range(5, 105)],
+                                               [f'User{i:03d}' for i in range(105, 205)],
+                                               [f'User{i:03d}' for i in range(205, 250)]]
+    assert os.getpid() not in {pid for pid, _ in results}
+
+
+def test_pool_is_reused_until_the_book_changes(book):
+    list(parallel.map_ranges(_pid_and_names, book, 0, 250, 100, workers=2))
+    pool = parallel._pool
+    list(parallel.map_ranges(_pid_and_names, book, 0, 250, 100, workers=2))
+    assert parallel._pool is pool
+
+    book.apply_batch([('add user', 'Zoe')])
+    results = list(parallel.map_ranges(_pid_and_names, book, 0, 251, 100, workers=2))
+
+    assert parallel._pool is not pool
+    assert results[-1][1][-1] == 'Zoe'
+
+
+def test_parallel_output_matches_serial(book, tmp_path):
+    assert list(render_tables(book.pages('User100', n=7), 2)) == list(render_tables(book.pages('User100', n=7), 1))
+    assert '\n'.join(render_tables(book, 2)) == '\n'.join(render_tables(book, 1))
+
+    for fmt in ('csv', 'columnar'):
+        writer = export.WRITERS[fmt]
+        serial, forked = tmp_path / f'serial.{fmt}', tmp_path / f'forked.{fmt}'
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(writer, 'chunk_records', 64)
+            assert book.save(str(serial), fmt, workers=1) == book.save(str(forked), fmt, workers=2) == 250
+        assert serial.read_bytes() == forked.read_bytes()
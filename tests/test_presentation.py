@@ -0,0 +1,40 @@
+from address_book import AddressBook
+from presentation import joined, render_terminal
+from results import Result
+
+
+def users(count: int) -> AddressBook:
+    book = AddressBook()
+    book.apply_batch([('add user', f'User {i:05d}') for i in range(count)])
+    return book
+
+
+def test_show_all_is_streamed_in_chunks():
+    book = users(5000)
+    pulled = []
+
+    def pages():
+        for page in book.pages():
+            pulled.append(page)
+            yield page
+
+    chunks = render_terminal(Result(data=pages()))
+    first = next(chunks)
+
+    assert 'User 00000' in first
+    assert len(pulled) < 500
+    assert sum(1 for _ in chunks) > 0
+
+
+def test_streamed_tables_join_to_the_whole_book():
+    text = joined(render_terminal(Result(data=users(25))))
+
+    assert text.count('User 000') == 25
+    assert text.index('User 00000') < text.index('User 00024')
+
+
+def test_list_of_results_with_a_table_renders_as_text():
+    text = render_terminal([Result('Found:'), Result(data=users(3))])
+
+    assert isinstance(text, str)
+    assert 'User 00002' in text
@@ -0,0 +1,97 @@
+from address_book import AddressBook, FixedClock, Record
+from datetime import date, datetime
+from exceptions import InvalidQuery
+import pytest
+import query
+
+
+@pytest.fixture
+def book(monkeypatch):
+    monkeypatch.setattr(Record, 'clock', FixedClock(date(2025, 12, 20)))
+    book = AddressBook()
+    book.apply_batch([
+        ('add user', 'Ann'), ('add phone', 'Ann', '3801234567'), ('add birthday', 'Ann', datetime(1990, 12, 25)),
+        ('add user', 'Anna'), ('add phone', 'Anna', '0501234567'), ('add birthday', 'Anna', datetime(1991, 1, 5)),
+        ('add user', 'Bob'), ('add phone', 'Bob', '3807654321'), ('add birthday', 'Bob', datetime(1992, 6, 1)),
+        ('add user', 'Leap'), ('add birthday', 'Leap', datetime(1996, 2, 29)),
+        ('add user', 'Zoe'),
+    ])
+    return book
+
+
+def found(book: AddressBook, text: str) -> list[str]:
+    return list(book.search(text).data)
+
+
+@pytest.mark.parametrize('text, names', [
+    ('born:1991', ['Anna']),
+    ('born:1990..1991', ['Ann', 'Anna']),
+    ('born<1992', ['Ann', 'Anna']),
+    ('born<=1992', ['Ann', 'Anna', 'Bob']),
+    ('born>1991', ['Bob', 'Leap']),
+    ('born>=1991', ['Anna', 'Bob', 'Leap']),
+    ('born<1991-01-05', ['Ann']),
+    ('born:..1990', ['Ann']),
+])
+def test_born(book, text, names):
+    assert found(book, text) == names
+
+
+@pytest.mark.parametrize('text', ['born<1990..1992', 'born:abc', 'birthday<x', 'phone:^abc', 'limit:x', 'name<a'])
+def test_invalid_queries(book, text):
+    with pytest.raises(InvalidQuery):
+        book.search(text)
+
+
+def test_bare_words_keep_the_substring_search(book):
+    assert found(book, 'nn') == ['Ann', 'Anna']
+    assert found(book, '7654') == ['Bob']
+    assert found(book, 'zo') == ['Zoe']
+
+
+def test_limit_and_offset(book):
+    assert found(book, 'limit:2 offset:1') == ['Anna', 'Bob']
+
+
+def test_indexed_and_scan_plans(book):
+    assert book.explain('nn')[0] == 'scan all 5 users in name order'
+    assert book.explain('name:^an')[0] == "name index: name starts with 'an' (2 candidates)"
+
+    plan = book.explain('name:^an phone:^3801')
+    assert plan[0] == 'phone index: phone starts with 3801 (1 candidates)'
+    assert plan[1:] == ['sort the candidates by name', "filter: name starts with 'an'"]
+
+    assert found(book, 'name:^an phone:^380') == ['Ann']
+    assert found(book, 'name:^an phone:^3807') == []
+
+
+def test_birthday_window_across_the_year_end(book):
+    index = query.index_of(book)
+    assert len(index.calendar_ranges(date(2025, 12, 20), 0, 29)) == 2
+
+    assert book.explain('birthday<30d')[0] == 'birthday calendar index: birthday in 0 to 29 days (2 candidates)'
+    assert found(book, 'birthday<30d') == ['Ann', 'Anna']
+    assert found(book, 'birthday<10d') == ['Ann']
+    assert found(book, 'birthday>10d born<1992') == ['Anna']
+
+
+@pytest.mark.parametrize('today, days', [(date(2025, 2, 20), 8), (date(2024, 2, 20), 9)])
+def test_february_29(book, monkeypatch, today, days):
+    monkeypatch.setattr(Record, 'clock', FixedClock(today))
+
+    assert found(book, f'birthday={days}d') == ['Leap']
+    assert found(book, f'birthday<{days}d') == []
+
+
+def test_indexes_follow_the_changes(book):
+    assert found(book, 'phone:^050') == ['Anna']
+
+    book.apply_batch([('change phone', 'Anna', '0501234567', '0679999999'), ('add phone', 'Zoe', '0501111111'),
+                      ('remove birthday', 'Ann'), ('remove user', 'Bob')])
+
+    assert found(book, 'phone:^050') == ['Zoe']
+    assert found(book, 'phone:^067') == ['Anna']
+    assert found(book, 'born:1990..1992') == ['Anna']
+    fresh = query.BookIndex(book)
+    index = query.index_of(book)
+    assert (index.phones, index.born, index.calendar) == (fresh.phones, fresh.born, fresh.calendar)
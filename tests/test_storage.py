@@ -0,0 +1,183 @@
+from address_book import AddressBook, Name, Phone, Record
+from contextlib import contextmanager
+from storage import Storage, read, read_version
+import events
+import os
+import stat
+
+
+@contextmanager
+def only(storage: Storage):
+    """Collect the events in one storage only, as if the other ones were in other processes."""
+
+    others = [callback for callback in events.bus._subscribers if callback != storage.pending.append]
+    for callback in others:
+        events.bus.unsubscribe(callback)
+    try:
+        yield
+    finally:
+        for callback in others:
+            events.bus.subscribe(callback)
+
+
+def two_processes(tmp_path):
+    path = str(tmp_path / 'users.bin')
+    first, second = Storage(path), Storage(path)
+    return path, (first, first.load()), (second, second.load())
+
+
+def test_concurrent_saves_are_merged(tmp_path):
+    path, (a, book_a), (b, book_b) = two_processes(tmp_path)
+
+    with only(a):
+        book_a.apply_batch([('add user', 'Ann'), ('add phone', 'Ann', '0501234567')])
+        book_a = a.save(book_a)
+    with only(b):
+        book_b.apply_batch([('add user', 'Bob')])
+        book_b = b.save(book_b)
+
+    assert read_version(path) == 2
+    assert sorted(read(path)[1].data) == ['Ann', 'Bob']
+    assert [phone.value for phone in book_b['Ann'].phones] == ['0501234567']
+    assert b.conflicts == []
+
+
+def test_refresh_picks_up_the_other_process(tmp_path):
+    path, (a, book_a), (b, book_b) = two_processes(tmp_path)
+
+    with only(a):
+        book_a.apply_batch([('add user', 'Ann')])
+        a.save(book_a)
+    with only(b):
+        book_b.apply_batch([('add user', 'Bob')])
+        book_b = b.refresh(book_b)
+
+    assert sorted(book_b.data) == ['Ann', 'Bob']
+    assert b.version == 1
+    assert b.pending
+
+
+def test_changes_that_no_longer_apply_are_reported(tmp_path):
+    path, (a, book_a), (b, book_b) = two_processes(tmp_path)
+    with only(a):
+        book_a.apply_batch([('add user', 'Ann')])
+        book_a = a.save(book_a)
+    with only(b):
+        book_b = b.refresh(book_b)
+
+    with only(a):
+        book_a.apply_batch([('remove user', 'Ann')])
+        a.save(book_a)
+    with only(b):
+        book_b.apply_batch([('add phone', 'Ann', '0501234567')])
+        book_b = b.save(book_b)
+
+    assert 'Ann' not in book_b
+    assert [(event['type'], event['name']) for event, _ in b.conflicts] == [('phone_added', 'Ann')]
+    assert read_version(path) == 3
+
+
+def test_deleted_file_counts_as_an_empty_book(tmp_path):
+    path, (a, book_a), _ = two_processes(tmp_path)
+    with only(a):
+        book_a.apply_batch([('add user', 'Ann')])
+        book_a = a.save(book_a)
+        book_a.apply_batch([('add user', 'Bob')])
+
+        os.remove(path)
+        book_a = a.refresh(book_a)
+        assert list(book_a.data) == ['Bob']
+
+        a.save(book_a)
+    assert list(read(path)[1].data) == ['Bob']
+
+
+def test_save_keeps_the_permissions(tmp_path):
+    path, (a, book), _ = two_processes(tmp_path)
+    umask = os.umask(0o022)
+    try:
+        with only(a):
+            book.apply_batch([('add user', 'Ann')])
+            a.save(book)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+        os.chmod(path, 0o640)
+        with only(a):
+            book.apply_batch([('add user', 'Bob')])
+            a.save(book)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    finally:
+        os.umask(umask)
+
+
+def test_sinks_sharing_a_log_keep_the_numbering(tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    first, second = events.JsonlSink(path), events.JsonlSink(path)
+    for sink in (first, second, second, first, second):
+        sink({'type': events.USER_ADDED, 'name': 'Ann', 'phones': [], 'birthday': None})
+    first.close()
+    second.close()
+
+    assert [event['seq'] for event in events.read_events(path)] == [1, 2, 3, 4, 5]
+    assert [event['seq'] for event in events.read_events(path, offset=3)] == [4, 5]
+
+
+def test_only_saved_changes_reach_the_subscribers(tmp_path):
+    path, (a, book_a), (b, book_b) = two_processes(tmp_path)
+    log = str(tmp_path / 'changes.jsonl')
+    sink = b.subscribe(events.JsonlSink(log))
+    with only(a):
+        book_a.apply_batch([('add user', 'Ann')])
+        book_a = a.save(book_a)
+    with only(b):
+        book_b = b.refresh(book_b)
+
+    with only(a):
+        book_a.apply_batch([('remove user', 'Ann')])
+        a.save(book_a)
+    with only(b):
+        book_b.apply_batch([('add phone', 'Ann', '0501234567'), ('add user', 'Bob')])
+        assert not os.path.exists(log) or not list(events.read_events(log))
+        book_b = b.save(book_b)
+    sink.close()
+
+    assert [(event['type'], event['name']) for event, _ in b.conflicts] == [('phone_added', 'Ann')]
+    assert [(event['seq'], event['type'], event['name']) for event in events.read_events(log)] == [
+        (1, 'user_added', 'Bob')]
+    assert b.pending == []
+
+
+def test_conflicting_user_is_not_merged_into_the_other_one(tmp_path):
+    path, (a, book_a), (b, book_b) = two_processes(tmp_path)
+    with only(a):
+        book_a.apply_batch([('add user', 'Ann')])
+        a.save(book_a)
+    with only(b):
+        book_b.apply_batch([('add user', 'Ann'), ('add phone', 'Ann', '0501234567')])
+        book_b = b.save(book_b)
+
+    assert [(event['type'], event['name']) for event, _ in b.conflicts] == [('user_added', 'Ann'), ('phone_added', 'Ann')]
+    assert book_b['Ann'].phones == []
+
+
+def test_records_stored_by_name_are_saved(tmp_path):
+    path, (a, book), _ = two_processes(tmp_path)
+    with only(a):
+        book.apply_batch([('add user', 'Ann')])
+        a.save(book)
+        book['Bob'] = Record(Name('Bob'), Phone('0501234567'))
+        book['Ann'] = Record(Name('Ann'), Phone('0671234567'))
+        a.save(book)
+
+    saved = read(path)[1]
+    assert sorted(saved.data) == ['Ann', 'Bob']
+    assert [phone.value for phone in saved['Ann'].phones] == ['0671234567']
+
+
+def test_search_results_publish_nothing(bus):
+    book = AddressBook()
+    book.apply_batch([('add user', 'Ann')])
+    published = bus.subscribe([].append).__self__
+
+    assert list(book.search('ann').data) == ['Ann']
+    assert published == []